@@ -0,0 +1,92 @@
+"""
+Compara o caminho antigo (strings object) com colunas category nas
+operações que o dashboard faz a cada interação: memória, isin e groupby.
+
+    python benchmarks/bench_categoricals.py [n_linhas]
+"""
+from pathlib import Path
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from services.event_index import mascara_isin  # noqa: E402
+
+CATEGORICAS = {
+    "Tipo": ["entrada", "saida"],
+    "Cliente": [f"cliente {i}" for i in range(200)],
+    "Forma de Pagamento": ["pix", "cartao", "dinheiro", "boleto"],
+    "Categoria": ["venda", "alimentacao", "transporte", "manutencao", "outros"],
+    "Produto": [f"produto {i}" for i in range(50)],
+}
+
+
+def gerar_base(n_linhas: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dados = {
+        col: np.array(valores, dtype=object)[rng.integers(0, len(valores), n_linhas)]
+        for col, valores in CATEGORICAS.items()
+    }
+    dados["Valor"] = rng.uniform(1, 1000, n_linhas).round(2)
+    return pd.DataFrame(dados).astype({col: object for col in CATEGORICAS})
+
+
+def _cronometrar(fn, repeticoes: int = 5) -> float:
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        melhor = min(melhor, time.perf_counter() - t0)
+    return melhor
+
+
+def main(n_linhas: int = 1_000_000):
+    base_obj = gerar_base(n_linhas)
+    base_cat = base_obj.astype({col: "category" for col in CATEGORICAS})
+
+    selecao = {
+        "Cliente": CATEGORICAS["Cliente"][:20],
+        "Forma de Pagamento": ["pix", "cartao"],
+        "Produto": CATEGORICAS["Produto"][:10],
+    }
+
+    def filtrar_obj():
+        mask = np.ones(len(base_obj), dtype=bool)
+        for col, valores in selecao.items():
+            mask &= base_obj[col].astype(str).isin(valores).to_numpy()
+        return mask
+
+    def filtrar_cat():
+        mask = np.ones(len(base_cat), dtype=bool)
+        for col, valores in selecao.items():
+            mask &= mascara_isin(base_cat[col], valores)
+        return mask
+
+    assert (filtrar_obj() == filtrar_cat()).all()
+
+    mem_obj = base_obj.memory_usage(deep=True).sum() / 1024 ** 2
+    mem_cat = base_cat.memory_usage(deep=True).sum() / 1024 ** 2
+
+    resultados = [
+        ("memória (MB)", mem_obj, mem_cat),
+        ("isin em 3 colunas (ms)", _cronometrar(filtrar_obj) * 1000, _cronometrar(filtrar_cat) * 1000),
+        (
+            "groupby tipo/cliente (ms)",
+            _cronometrar(lambda: base_obj.groupby(["Tipo", "Cliente"])["Valor"].sum()) * 1000,
+            _cronometrar(
+                lambda: base_cat.groupby(["Tipo", "Cliente"], observed=True)["Valor"].sum()
+            ) * 1000,
+        ),
+    ]
+
+    print(f"{n_linhas:,} linhas")
+    print(f"{'':28}{'object':>12}{'category':>12}{'ganho':>10}")
+    for nome, obj, cat in resultados:
+        print(f"{nome:28}{obj:12.1f}{cat:12.1f}{obj / cat:9.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,68 @@
+"""
+Leitura da planilha pelo exportador contra a planilha falsa (fake_sheets):
+uma única chamada get_values (caminho antigo), faixas em série e faixas via
+batchGet em paralelo (services.sheets_client.iter_row_ranges). Confere que as
+faixas voltam na ordem certa e mostra o backoff com 429 injetados.
+
+    python benchmarks/bench_fetch.py [n_linhas]
+"""
+from pathlib import Path
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_sheets import FakeWorksheet, gerar_linhas  # noqa: E402
+from services.sheets_client import iter_row_ranges  # noqa: E402
+
+N_COLS = "I"
+
+
+def chamada_unica(ws) -> list[list[str]]:
+    return ws.get_values(f"A2:{N_COLS}")
+
+
+def faixas_em_serie(ws, batch_rows: int) -> list[list[str]]:
+    linhas = []
+    for first in range(2, ws.row_count + 1, batch_rows):
+        linhas += ws.get_values(f"A{first}:{N_COLS}{min(first + batch_rows - 1, ws.row_count)}")
+    return linhas
+
+
+def faixas_em_paralelo(ws, batch_rows: int, workers: int) -> list[list[str]]:
+    linhas = []
+    for _, values in iter_row_ranges(ws, 2, ws.row_count, N_COLS, batch_rows=batch_rows, workers=workers):
+        linhas += values
+    return linhas
+
+
+def medir(nome: str, ws, fn):
+    t0 = time.perf_counter()
+    linhas = fn(ws)
+    tempo = time.perf_counter() - t0
+    assert linhas == ws.values[1:], f"{nome}: linhas fora de ordem ou faltando"
+    print(f"{nome:<40}{tempo:>10.2f}{ws.chamadas:>10}{ws.recusadas:>10}")
+
+
+def main(n_linhas: int = 100_000):
+    linhas = gerar_linhas(n_linhas)
+    print(f"{n_linhas:,} linhas (latência simulada: 150 ms por chamada + 20 µs por linha)")
+    print(f"{'modo':<40}{'tempo (s)':>10}{'chamadas':>10}{'429':>10}")
+
+    medir("get_values único", FakeWorksheet(linhas), chamada_unica)
+    medir("faixas de 5000 em série", FakeWorksheet(linhas), lambda ws: faixas_em_serie(ws, 5000))
+    for workers in [2, 4, 8]:
+        medir(
+            f"batchGet em paralelo ({workers} workers)",
+            FakeWorksheet(linhas),
+            lambda ws, w=workers: faixas_em_paralelo(ws, 5000, w),
+        )
+    medir(
+        "batchGet em paralelo (4 workers), 30% 429",
+        FakeWorksheet(linhas, taxa_429=0.3, seed=3),
+        lambda ws: faixas_em_paralelo(ws, 5000, 4),
+    )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
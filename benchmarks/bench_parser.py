@@ -0,0 +1,267 @@
+"""
+Compara o parser antigo das mensagens do Telegram (aliases montados e regex
+compiladas a cada chamada) com services.telegram_parser, num corpus sintético
+de mensagens do canal (1 milhão por padrão).
+
+Antes de cronometrar, verifica a propriedade de equivalência: em mensagens
+geradas aleatoriamente no formato que o parser antigo entende (chaves com
+maiúsculas/espaços variados, ":" ou "=", aspas, valores vazios, ";" dentro
+dos valores, "; chave:" no meio de uma linha, linhas de ruído, quebras \\n,
+\\r\\n e \\r), os dois devolvem exatamente o mesmo resultado. Os formatos
+novos (emoji/marcador antes da chave, chaves acentuadas, "k=v;" em mensagens
+de várias linhas) são conferidos à parte, contra os campos esperados.
+
+    python benchmarks/bench_parser.py [n_mensagens] [n_casos_equivalencia]
+"""
+from pathlib import Path
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from services.telegram_parser import parse_telegram_payload  # noqa: E402
+
+
+def parse_antigo(raw_text):
+    # Parses messages like:
+    # Tipo: String
+    # Valor: Decimal
+    # Descrição: String
+    # Cliente: String
+    # Forma de Pagamento: String
+    if raw_text is None:
+        return None
+    text_val = str(raw_text).strip()
+    if text_val == "":
+        return None
+
+    field_aliases = {
+        "tipo": "Tipo",
+        "valor": "Valor",
+        "descrição": "Descrição",
+        "descricao": "Descrição",
+        "cliente": "Cliente",
+        "forma de pagamento": "Forma de Pagamento",
+        "forma_pagamento": "Forma de Pagamento",
+        "forma": "Forma de Pagamento",
+        "pagamento": "Forma de Pagamento",
+        "data": "Data",
+    }
+    out = {
+        "Tipo": None,
+        "Valor": None,
+        "Descrição": None,
+        "Cliente": None,
+        "Forma de Pagamento": None,
+        "Data": None,
+    }
+
+    # Split por linhas; também aceita uma única linha com ';'
+    parts = []
+    for chunk in re.split(r"[\n\r]+", text_val):
+        chunk2 = chunk.strip()
+        if chunk2 != "":
+            parts.append(chunk2)
+    if len(parts) == 1 and ";" in parts[0]:
+        parts = [p.strip() for p in parts[0].split(";") if p.strip()]
+
+    for part in parts:
+        m = re.match(r"^\s*([^:=]+?)\s*[:=]\s*(.*)\s*$", part)
+        if not m:
+            continue
+        key_raw = m.group(1).strip().lower()
+        val_raw = m.group(2).strip()
+        val_raw = val_raw.strip('"').strip("'")
+        key_norm = re.sub(r"\s+", " ", key_raw)
+        if key_norm in field_aliases:
+            out[field_aliases[key_norm]] = val_raw
+
+    if not out.get("Tipo") and not out.get("Valor"):
+        return None
+    return out
+
+
+# ==========================================================
+# GERADORES
+# ==========================================================
+CHAVES_ANTIGAS = [
+    "tipo", "valor", "descrição", "descricao", "cliente", "forma de pagamento",
+    "forma_pagamento", "forma", "pagamento", "data",
+]
+CHAVES_RUIDO = ["obs", "total", "hora", "observação", "qtd", "ref"]
+PALAVRAS = ["arroz", "feijão", "pix", "Ana", "Bruno", "cartão", "12,50", "1.234,56", "10", "31/01/2025", "ok", "💰"]
+ESPACOS = [" ", "  ", "\t", " ", ""]
+QUEBRAS = ["\n", "\r\n", "\r", "\n\n", "\n \n"]
+RUIDO = "ab :=;\"'\t-"
+
+
+def _caixa(rnd: random.Random, chave: str) -> str:
+    escolha = rnd.random()
+    if escolha < 0.5:
+        return chave
+    if escolha < 0.7:
+        return chave.upper()
+    if escolha < 0.85:
+        return chave.title()
+    return "".join(c.upper() if rnd.random() < 0.5 else c for c in chave)
+
+
+def _chave(rnd: random.Random, chaves: list[str]) -> str:
+    chave = _caixa(rnd, rnd.choice(chaves))
+    # espaços internos repetidos/tabs ("forma  de\tpagamento")
+    return re.sub(" ", lambda _: rnd.choice([" ", "  ", "\t", "  "]), chave)
+
+
+def _valor(rnd: random.Random, com_ponto_e_virgula: bool) -> str:
+    n = rnd.randint(0, 3)
+    palavras = [rnd.choice(PALAVRAS) for _ in range(n)]
+    valor = " ".join(palavras)
+    if com_ponto_e_virgula and rnd.random() < 0.2:
+        valor += rnd.choice(["; ", ";"]) + rnd.choice(PALAVRAS)
+    if rnd.random() < 0.1:
+        # ":" e "=" dentro do valor, depois de uma palavra que não é chave
+        valor += rnd.choice([" hora: 10:30", " a=b", " ref=3"])
+    if rnd.random() < 0.2:
+        aspa = rnd.choice(['"', "'", "\"'", "'\""])
+        valor = aspa + valor + aspa[::-1]
+    return valor
+
+
+def mensagem_antiga(rnd: random.Random) -> str:
+    """Mensagem no formato que o parser antigo entende, com casos de borda."""
+    linha_unica = rnd.random() < 0.3
+    n_campos = rnd.randint(0, 7)
+
+    partes, chaves_usadas = [], []
+    for _ in range(n_campos):
+        chaves = CHAVES_ANTIGAS if rnd.random() < 0.85 else CHAVES_RUIDO
+        sep = rnd.choice([":", "=", " : ", "= ", "::", ":="])
+        chave = _chave(rnd, chaves)
+        chaves_usadas.append(chave)
+        partes.append(
+            rnd.choice(ESPACOS) + chave + sep + rnd.choice(ESPACOS)
+            + _valor(rnd, com_ponto_e_virgula=not linha_unica) + rnd.choice(ESPACOS)
+        )
+
+    if not linha_unica and partes and rnd.random() < 0.3:
+        # "; chave: valor" no meio de uma linha, que o parser antigo deixa no
+        # valor: depois de uma Descrição (texto livre) ou de uma chave de ruído
+        # vale qualquer chave; depois das outras, só chaves que têm linha própria
+        i = rnd.randrange(len(partes))
+        livre = " ".join(chaves_usadas[i].lower().split()) in ("descrição", "descricao") \
+            or chaves_usadas[i] in CHAVES_RUIDO
+        chave = _chave(rnd, CHAVES_ANTIGAS) if livre else rnd.choice(chaves_usadas)
+        partes[i] = partes[i].rstrip() + rnd.choice(["; ", ";"]) + chave \
+            + rnd.choice([": ", "=", " : "]) + _valor(rnd, com_ponto_e_virgula=False)
+    for _ in range(rnd.randint(0, 2)):
+        ruido = "".join(rnd.choice(RUIDO) for _ in range(rnd.randint(0, 8)))
+        partes.insert(rnd.randint(0, len(partes)), ruido)
+
+    if linha_unica:
+        texto = rnd.choice([";", "; ", " ;"]).join(partes)
+    else:
+        texto = ""
+        for parte in partes:
+            texto += parte + rnd.choice(QUEBRAS)
+    return rnd.choice(["", " ", "\n"]) + texto
+
+
+def gerar_corpus(n_mensagens: int, seed: int = 42) -> list[str]:
+    """Mistura parecida com a do canal: lançamentos em várias linhas, em uma linha, formatos novos e conversa."""
+    rnd = random.Random(seed)
+    corpus = []
+    for i in range(n_mensagens):
+        tipo = rnd.choice(["entrada", "saida", "Saída"])
+        valor = f"{rnd.randint(1, 99999) / 100:.2f}".replace(".", ",")
+        cliente = rnd.choice(["Ana", "Bruno", "Carla"])
+        forma = rnd.choice(["pix", "cartao", "dinheiro"])
+        data = f"{rnd.randint(1, 28):02d}/{rnd.randint(1, 12):02d}/2025"
+        sorteio = rnd.random()
+        if sorteio < 0.55:
+            corpus.append(
+                f"Tipo: {tipo}\nValor: {valor}\nDescrição: lançamento {i}\n"
+                f"Cliente: {cliente}\nForma de Pagamento: {forma}\nData: {data}"
+            )
+        elif sorteio < 0.75:
+            corpus.append(f"tipo={tipo}; valor={valor}; cliente={cliente}; forma={forma}")
+        elif sorteio < 0.9:
+            corpus.append(
+                f"✅ Tipo: {tipo}\n💰 Valor = {valor}\n- DESCRIÇÃO: lançamento {i}; pago\n"
+                f"Cliente={cliente}; Forma de pagamento={forma}"
+            )
+        else:
+            corpus.append(rnd.choice(["bom dia", "ok 👍", "alguém viu o boleto?", "valeu!"]))
+    return corpus
+
+
+# ==========================================================
+# VERIFICAÇÕES
+# ==========================================================
+FORMATOS_NOVOS = [
+    ("💰 Valor: 10\n- Tipo: saida", {"Valor": "10", "Tipo": "saida"}),
+    ("• Cliente: Ana\n✅ tipo : entrada", {"Cliente": "Ana", "Tipo": "entrada"}),
+    ("DESCRICAO: x\nFórma de Pagamento: pix\nvalor: 3", {"Descrição": "x", "Forma de Pagamento": "pix", "Valor": "3"}),
+    ("Tipo: entrada\nValor=1; Cliente=Ana; Descrição: arroz; feijão",
+     {"Tipo": "entrada", "Valor": "1", "Cliente": "Ana", "Descrição": "arroz; feijão"}),
+    ("*Tipo*: saida; *Valor*: 5", {"Tipo": "saida", "Valor": "5"}),
+]
+
+# "; chave:" dentro de um valor numa mensagem de várias linhas: fica no valor,
+# como no parser antigo (nunca vira outro campo)
+CASOS_PONTO_E_VIRGULA = [
+    "Tipo: saida\nValor: 10\nDescrição: frete; valor: 3 por kg",
+    "Tipo: saida\nValor: 10\nDescrição: paguei; data: amanhã",
+    "Tipo: saida\nDescrição: frete; valor: 3 por kg\nValor: 10",
+    "Tipo: saida\nValor: 10\nForma: pix; valor: 3",
+    "Tipo: entrada\nValor: 5\nobs: ver; cliente: Ana",
+]
+
+
+def verificar_equivalencia(n_casos: int, seed: int = 7):
+    rnd = random.Random(seed)
+    for _ in range(n_casos):
+        texto = mensagem_antiga(rnd)
+        antigo, novo = parse_antigo(texto), parse_telegram_payload(texto)
+        if antigo != novo:
+            raise AssertionError(f"Resultados diferentes para {texto!r}:\nantigo: {antigo}\nnovo:   {novo}")
+
+    for texto in CASOS_PONTO_E_VIRGULA:
+        antigo, novo = parse_antigo(texto), parse_telegram_payload(texto)
+        if antigo != novo:
+            raise AssertionError(f"Resultados diferentes para {texto!r}:\nantigo: {antigo}\nnovo:   {novo}")
+
+    for texto, esperado in FORMATOS_NOVOS:
+        novo = parse_telegram_payload(texto) or {}
+        obtido = {k: v for k, v in novo.items() if v is not None}
+        if obtido != esperado:
+            raise AssertionError(f"Formato novo {texto!r}: esperado {esperado}, obtido {obtido}")
+
+
+def _cronometrar(fn, corpus) -> tuple[float, int]:
+    t0 = time.perf_counter()
+    aceitas = sum(fn(m) is not None for m in corpus)
+    return time.perf_counter() - t0, aceitas
+
+
+def main(n_mensagens: int = 1_000_000, n_casos: int = 200_000):
+    t0 = time.perf_counter()
+    verificar_equivalencia(n_casos)
+    print(f"Equivalência: {n_casos:,} mensagens aleatórias no formato antigo, resultados idênticos "
+          f"({time.perf_counter() - t0:.1f}s); {len(CASOS_PONTO_E_VIRGULA)} casos de \";\" no valor "
+          f"e {len(FORMATOS_NOVOS)} formatos novos conferidos")
+
+    corpus = gerar_corpus(n_mensagens)
+    t_old, ok_old = _cronometrar(parse_antigo, corpus)
+    t_new, ok_new = _cronometrar(parse_telegram_payload, corpus)
+
+    print(f"{n_mensagens:,} mensagens")
+    print(f"{'parser':<12}{'tempo (s)':>10}{'µs/msg':>10}{'lançamentos':>14}")
+    for nome, t, ok in [("antigo", t_old, ok_old), ("compilado", t_new, ok_new)]:
+        print(f"{nome:<12}{t:>10.2f}{t / n_mensagens * 1e6:>10.2f}{ok:>14,}")
+    print(f"ganho: {t_old / t_new:.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
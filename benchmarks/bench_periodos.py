@@ -0,0 +1,74 @@
+"""
+Compara o cálculo antigo de período/percentual de lucro (apply por linha)
+com o módulo vetorizado services.periodos.
+
+    python benchmarks/bench_periodos.py [n_linhas]
+"""
+from pathlib import Path
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from services.periodos import calcular_lucro, inicio_periodo  # noqa: E402
+
+
+def gerar_base(n_linhas: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    datas = np.datetime64("2015-01-01") + rng.integers(0, 3650, n_linhas).astype("timedelta64[D]")
+    entrada = rng.uniform(0, 1000, n_linhas).round(2)
+    entrada[rng.random(n_linhas) < 0.1] = 0
+    return pd.DataFrame({
+        "Data": pd.to_datetime(datas),
+        "entrada": entrada,
+        "saida": rng.uniform(0, 1000, n_linhas).round(2),
+    })
+
+
+def semana_antiga(df: pd.DataFrame) -> pd.Series:
+    return df["Data"].dt.to_period("W").apply(lambda r: r.start_time)
+
+
+def lucro_antigo(df: pd.DataFrame) -> pd.DataFrame:
+    base = df.copy()
+    base["lucro"] = base["entrada"] - base["saida"]
+    base["perc_lucro"] = base.apply(
+        lambda row: ((row["lucro"] / row["entrada"]) * 100) if row["entrada"] != 0 else 0,
+        axis=1,
+    )
+    base["cor"] = base["perc_lucro"].apply(lambda x: "green" if x >= 0 else "red")
+    return base
+
+
+def _cronometrar(fn) -> tuple[float, object]:
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+
+def main(n_linhas: int = 1_000_000):
+    df = gerar_base(n_linhas)
+
+    t_sem_old, sem_old = _cronometrar(lambda: semana_antiga(df))
+    t_sem_new, sem_new = _cronometrar(lambda: inicio_periodo(df["Data"], "Semana"))
+    assert (sem_old.to_numpy() == sem_new.to_numpy()).all()
+
+    t_luc_old, luc_old = _cronometrar(lambda: lucro_antigo(df))
+    t_luc_new, luc_new = _cronometrar(lambda: calcular_lucro(df))
+    assert np.allclose(luc_old["perc_lucro"], luc_new["perc_lucro"])
+    assert (luc_old["cor"].to_numpy() == luc_new["cor"].to_numpy()).all()
+
+    print(f"{n_linhas:,} linhas")
+    print(f"{'':26}{'apply (s)':>12}{'vetorizado (s)':>16}{'ganho':>10}")
+    for nome, old, new in [
+        ("início da semana", t_sem_old, t_sem_new),
+        ("perc_lucro + cor", t_luc_old, t_luc_new),
+    ]:
+        print(f"{nome:26}{old:12.3f}{new:16.3f}{old / new:9.0f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
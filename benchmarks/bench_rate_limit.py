@@ -0,0 +1,95 @@
+"""
+Vários processos do mesmo host chamando uma API com cota por janela (o
+"servidor" simula o Sheets, em escala menor: 20 requisições a cada 2 s):
+só backoff depois do 429 (como antes) x token bucket compartilhado via SQLite
+(services.rate_limiter) antes de cada chamada.
+
+    python benchmarks/bench_rate_limit.py [processos] [chamadas_por_processo]
+"""
+from pathlib import Path
+import multiprocessing as mp
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from services.rate_limiter import SQLiteTokenBucket  # noqa: E402
+
+JANELA = 2.0
+LIMITE = 20
+LATENCIA = 0.05
+
+
+def _servidor_pedir(db: Path) -> bool:
+    """Cota em janela deslizante, compartilhada pelos processos: False = 429."""
+    conn = sqlite3.connect(db, timeout=30, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        agora = time.time()
+        conn.execute("DELETE FROM hits WHERE t < ?", (agora - JANELA,))
+        (n,) = conn.execute("SELECT COUNT(*) FROM hits").fetchone()
+        aceito = n < LIMITE
+        if aceito:
+            conn.execute("INSERT INTO hits (t) VALUES (?)", (agora,))
+        conn.execute("COMMIT")
+        return aceito
+    finally:
+        conn.close()
+
+
+def _cliente(args):
+    servidor_db, limiter_db, chamadas = args
+    balde = None
+    if limiter_db:
+        balde = SQLiteTokenBucket(Path(limiter_db), "reads", limit=LIMITE, window=JANELA)
+
+    recusas, espera, espera_max = 0, 0.0, 0.0
+    for _ in range(chamadas):
+        atraso = 1.0
+        while True:
+            if balde is not None:
+                w = balde.acquire()
+                espera += w
+                espera_max = max(espera_max, w)
+            time.sleep(LATENCIA)
+            if _servidor_pedir(Path(servidor_db)):
+                break
+            # mesmo backoff de with_backoff: 1s, 2s, 4s...
+            recusas += 1
+            time.sleep(atraso)
+            atraso *= 2
+    return recusas, espera, espera_max
+
+
+def rodar(processos: int, chamadas: int, com_limitador: bool):
+    with tempfile.TemporaryDirectory() as tmp:
+        servidor_db = Path(tmp) / "servidor.sqlite"
+        with sqlite3.connect(servidor_db) as conn:
+            conn.execute("CREATE TABLE hits (t REAL)")
+        limiter_db = str(Path(tmp) / "limiter.sqlite") if com_limitador else ""
+
+        t0 = time.perf_counter()
+        with mp.Pool(processos) as pool:
+            resultados = pool.map(_cliente, [(str(servidor_db), limiter_db, chamadas)] * processos)
+        tempo = time.perf_counter() - t0
+
+    recusas = sum(r[0] for r in resultados)
+    espera = sum(r[1] for r in resultados)
+    espera_max = max(r[2] for r in resultados)
+    return tempo, recusas, espera, espera_max
+
+
+def main(processos: int = 4, chamadas: int = 25):
+    total = processos * chamadas
+    print(f"{processos} processos x {chamadas} chamadas; cota {LIMITE} a cada {JANELA:.0f}s "
+          f"(mínimo teórico {total / LIMITE * JANELA:.1f}s)")
+    print(f"{'modo':<32}{'tempo (s)':>10}{'429':>8}{'espera total (s)':>18}{'espera máx (s)':>16}")
+    for nome, com_limitador in [("só backoff após 429", False), ("token bucket compartilhado", True)]:
+        tempo, recusas, espera, espera_max = rodar(processos, chamadas, com_limitador)
+        print(f"{nome:<32}{tempo:>10.1f}{recusas:>8}{espera:>18.1f}{espera_max:>16.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
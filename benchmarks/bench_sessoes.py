@@ -0,0 +1,131 @@
+"""
+Memória retida por N sessões simultâneas olhando a mesma base:
+
+- antes: st.cache_data entrega uma cópia via pickle para cada sessão, e
+  aplicar_filtros fazia df.copy() antes de filtrar;
+- agora: uma base por processo (st.cache_resource), cada sessão recebe uma
+  view (copy(deep=False)) e só materializa as linhas que selecionou.
+
+E por N períodos diferentes escolhidos pelas sessões:
+
+- antes: cache por (versão, início, fim), cada período com o próprio frame,
+  índice invertido e cubo diário;
+- agora: frame, índice e cubo uma vez por versão; o período é uma fatia de
+  posições do frame (load_events) e um recorte do índice (recortar_indice).
+
+    python benchmarks/bench_sessoes.py [n_linhas]
+"""
+from pathlib import Path
+import gc
+import pickle
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from bench_categoricals import CATEGORICAS, gerar_base  # noqa: E402
+from services.event_index import construir_indice, faixa_periodo, recortar_indice  # noqa: E402
+from services.rollup import construir_cubo  # noqa: E402
+
+COLUNAS = {
+    "data": "Data",
+    "valor": "Valor",
+    "tipo": "Tipo",
+    "cliente": "Cliente",
+    "forma_pagamento": "Forma de Pagamento",
+    "categoria": "Categoria",
+    "produto": "Produto",
+}
+DIMENSOES = list(CATEGORICAS)
+
+def _memoria_mb() -> float:
+    # numpy reporta ao tracemalloc; strings do pandas 3 vivem no pool do Arrow
+    atual, _ = tracemalloc.get_traced_memory()
+    return (atual + pa.total_allocated_bytes()) / 1024 ** 2
+
+
+def sessao_antiga(base: pd.DataFrame, mascara: np.ndarray) -> list:
+    df = pickle.loads(pickle.dumps(base))
+    df_base = df.copy()
+    work_df = df_base[mascara].copy()
+    return [df, df_base, work_df]
+
+
+def sessao_nova(base: pd.DataFrame, linhas: np.ndarray | None) -> list:
+    df = base.copy(deep=False)
+    work_df = df.iloc[0:len(df)] if linhas is None else df.iloc[linhas]
+    return [df, work_df]
+
+
+def _periodos(base: pd.DataFrame, n: int) -> list:
+    # n intervalos diferentes de 90 dias espalhados pela base
+    datas = base["Data"]
+    dias = (datas.max() - datas.min()).days - 90
+    inicios = [datas.min() + pd.Timedelta(days=int(d)) for d in np.linspace(0, dias, n)]
+    return [(i.date(), (i + pd.Timedelta(days=89)).date()) for i in inicios]
+
+
+def periodos_antigos(base: pd.DataFrame, indice: dict, periodos: list) -> list:
+    caches = []
+    for inicio, fim in periodos:
+        lo, hi = faixa_periodo(indice, inicio, fim)
+        df = base.iloc[lo:hi].copy()
+        caches.append([df, construir_indice(df, "Data", DIMENSOES), construir_cubo(df, COLUNAS)])
+    return caches
+
+
+def periodos_novos(base: pd.DataFrame, indice: dict, periodos: list) -> list:
+    fatias = []
+    for inicio, fim in periodos:
+        lo, hi = faixa_periodo(indice, inicio, fim)
+        fatias.append([base.iloc[lo:hi], recortar_indice(indice, lo, hi)])
+    return fatias
+
+
+def medir(n_sessoes: int, criar_sessao) -> float:
+    gc.collect()
+    antes = _memoria_mb()
+    sessoes = [criar_sessao() for _ in range(n_sessoes)]
+    depois = _memoria_mb()
+    del sessoes
+    gc.collect()
+    return depois - antes
+
+
+def main(n_linhas: int = 500_000):
+    tracemalloc.start()
+    base = gerar_base(n_linhas).astype({col: "category" for col in CATEGORICAS})
+    rng = np.random.default_rng(7)
+    datas = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365, n_linhas), unit="D")
+    base["Data"] = np.sort(datas.to_numpy())
+    mascara = base["Forma de Pagamento"].isin(["pix"]).to_numpy()
+    linhas = np.flatnonzero(mascara)
+    tamanho_base = base.memory_usage(deep=True).sum() / 1024 ** 2
+
+    print(f"{n_linhas:,} linhas, base em memória: {tamanho_base:.1f} MB (compartilhada, 1x por processo)")
+    print(f"{'sessões':>8}{'antes (MB)':>14}{'agora, sem filtro':>20}{'agora, ~25% das linhas':>25}")
+    for n in [1, 10, 50]:
+        antes = medir(n, lambda: sessao_antiga(base, mascara))
+        sem_filtro = medir(n, lambda: sessao_nova(base, None))
+        com_filtro = medir(n, lambda: sessao_nova(base, linhas))
+        print(f"{n:>8}{antes:>14.1f}{sem_filtro:>20.1f}{com_filtro:>25.1f}")
+
+    # frame, índice e cubo da versão já ficam no processo: só conta o que cada período acrescenta
+    indice = construir_indice(base, "Data", DIMENSOES)
+    print()
+    print(f"{'períodos':>8}{'cache por período (MB)':>26}{'fatias da versão (MB)':>25}")
+    for n in [1, 4, 16]:
+        periodos = _periodos(base, n)
+        antes = medir(1, lambda: periodos_antigos(base, indice, periodos))
+        agora = medir(1, lambda: periodos_novos(base, indice, periodos))
+        print(f"{n:>8}{antes:>26.1f}{agora:>25.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
@@ -0,0 +1,92 @@
+"""
+Tempo de partida a frio de load_events: dataset Parquet particionado
+(descomprimir + decodificar + ordenar) x snapshot Arrow IPC sem compressão
+aberto com memory_map (services.snapshot). Cada carga roda num processo novo,
+como o primeiro acesso depois de um deploy.
+
+    python benchmarks/bench_snapshot.py [n_linhas]
+"""
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from bench_categoricals import gerar_base  # noqa: E402
+from services.event_schema import EXPORTED_AT_COL, build_schema, to_typed_table  # noqa: E402
+from services.snapshot import read_snapshot, write_snapshot  # noqa: E402
+
+
+def gerar_dataset(data_dir: Path, n_linhas: int) -> Path:
+    rng = np.random.default_rng(7)
+    df = gerar_base(n_linhas)
+    df["Descrição"] = "compra " + pd.Series(rng.integers(0, 10_000, n_linhas)).astype(str)
+    df["Data"] = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365 * 24 * 60, n_linhas), unit="min")
+    df[EXPORTED_AT_COL] = pd.Timestamp.now(tz="America/Sao_Paulo")
+
+    table = to_typed_table(df, build_schema(list(df.columns)))
+    table = table.append_column("ano", pc.year(table["Data"]))
+    table = table.append_column("mes", pc.month(table["Data"]))
+
+    dataset_dir = data_dir / "events"
+    pq.write_to_dataset(table, root_path=dataset_dir, partition_cols=["ano", "mes"])
+    write_snapshot(dataset_dir)
+    return dataset_dir
+
+
+def carregar(formato: str, dataset_dir: Path) -> float:
+    """Mesmo caminho de data_loader._load_events para a base inteira."""
+    t0 = time.perf_counter()
+    if formato == "arrow":
+        df = read_snapshot(dataset_dir).to_pandas(split_blocks=True)
+    else:
+        dataset = ds.dataset(dataset_dir, format="parquet", partitioning="hive")
+        cols = [c for c in dataset.schema.names if c not in ("ano", "mes")]
+        df = dataset.to_table(columns=cols).unify_dictionaries().to_pandas()
+        df = df.sort_values("Data", kind="stable", na_position="last", ignore_index=True)
+    assert len(df)
+    return time.perf_counter() - t0
+
+
+def medir(formato: str, dataset_dir: Path, repeticoes: int = 5) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        saida = subprocess.run(
+            [sys.executable, __file__, "--carregar", formato, str(dataset_dir)],
+            capture_output=True, text=True, check=True,
+        )
+        tempos.append(float(saida.stdout))
+    return statistics.median(tempos)
+
+
+def main(n_linhas: int = 1_000_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset_dir = gerar_dataset(Path(tmp), n_linhas)
+        tamanho_parquet = sum(f.stat().st_size for f in dataset_dir.rglob("*.parquet")) / 1024 ** 2
+        tamanho_arrow = (dataset_dir.parent / "events.arrow").stat().st_size / 1024 ** 2
+
+        print(f"{n_linhas:,} linhas")
+        print(f"{'formato':<28}{'disco (MB)':>12}{'partida a frio (ms)':>22}")
+        for nome, formato, tamanho in [
+            ("Parquet (data/events/)", "parquet", tamanho_parquet),
+            ("Arrow IPC + memory_map", "arrow", tamanho_arrow),
+        ]:
+            print(f"{nome:<28}{tamanho:>12.1f}{medir(formato, dataset_dir) * 1000:>22.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--carregar":
+        print(carregar(sys.argv[2], Path(sys.argv[3])))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
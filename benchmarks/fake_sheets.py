@@ -0,0 +1,134 @@
+"""
+Planilha falsa em memória com a mesma interface de gspread.Worksheet usada pelo
+exportador (row_count, title, row_values, get_values e
+spreadsheet.values_batch_get). Simula a latência da API (fixa por chamada +
+proporcional às linhas devolvidas) e 429 de cota, repetidos com o mesmo
+backoff do cliente compartilhado, para medir vazão e retentativas sem rede.
+"""
+from pathlib import Path
+import random
+import re
+import sys
+import threading
+import time
+
+from gspread.exceptions import APIError
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from services.sheets_client import with_backoff  # noqa: E402
+
+HEADER = ["Tipo", "Cliente", "Forma de Pagamento", "Categoria", "Produto", "Quantidade", "Descrição", "Valor", "Data"]
+
+
+def gerar_linhas(n_linhas: int, seed: int = 42) -> list[list[str]]:
+    rnd = random.Random(seed)
+    linhas = []
+    for i in range(n_linhas):
+        linhas.append([
+            rnd.choice(["entrada", "saida", "Saída"]),
+            rnd.choice(["Ana", "Bruno", "Carla", ""]),
+            rnd.choice(["pix", "Cartao", "dinheiro"]),
+            rnd.choice(["venda", "outros"]),
+            rnd.choice(["produto 1", "produto 2"]),
+            str(rnd.randint(1, 5)),
+            f"lançamento {i}",
+            f"{rnd.randint(1, 99999) / 100:.2f}".replace(".", ","),
+            f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+        ])
+    return linhas
+
+
+class _Resposta429:
+    status_code = 429
+    text = "Quota exceeded"
+
+    def json(self):
+        return {"error": {"code": 429, "message": "Quota exceeded for quota metric 'Read requests'", "status": "RESOURCE_EXHAUSTED"}}
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheet: "FakeWorksheet"):
+        self.worksheet = worksheet
+
+    # o SheetsHTTPClient real repete cada requisição recusada por cota
+    @with_backoff(max_retries=6, base=1.0)
+    def values_batch_get(self, ranges, params=None):
+        ws = self.worksheet
+        ws._chamada()
+        faixas = []
+        for rng in ranges:
+            values = ws._ler(rng.split("!")[-1])
+            faixa = {"range": rng, "majorDimension": "ROWS"}
+            if values:
+                faixa["values"] = values
+            faixas.append(faixa)
+        ws._latencia(sum(len(f.get("values", [])) for f in faixas))
+        return {"spreadsheetId": "fake", "valueRanges": faixas}
+
+
+class FakeWorksheet:
+    """
+    latencia_chamada: segundos fixos por requisição; latencia_linha: segundos
+    por linha devolvida; taxa_429: chance de cada requisição ser recusada por cota.
+    """
+
+    def __init__(
+        self,
+        linhas: list[list[str]],
+        latencia_chamada: float = 0.15,
+        latencia_linha: float = 0.00002,
+        taxa_429: float = 0.0,
+        seed: int = 0,
+    ):
+        self.title = "Página1"
+        self.values = [HEADER] + linhas
+        self.latencia_chamada = latencia_chamada
+        self.latencia_linha = latencia_linha
+        self.taxa_429 = taxa_429
+        self.spreadsheet = FakeSpreadsheet(self)
+        self.chamadas = 0
+        self.recusadas = 0
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def row_count(self) -> int:
+        # grade com folga de linhas vazias no fim, como numa planilha real
+        return len(self.values) + 500
+
+    def _chamada(self):
+        with self._lock:
+            self.chamadas += 1
+            recusar = self._rnd.random() < self.taxa_429
+            if recusar:
+                self.recusadas += 1
+        if recusar:
+            time.sleep(self.latencia_chamada)
+            raise APIError(_Resposta429())
+
+    def _latencia(self, n_linhas: int):
+        time.sleep(self.latencia_chamada + n_linhas * self.latencia_linha)
+
+    def _ler(self, rng: str) -> list[list[str]]:
+        m = re.match(r"A(\d+):([A-Z]+)(\d+)?$", rng)
+        first = int(m.group(1))
+        last = int(m.group(3)) if m.group(3) else len(self.values)
+        values = [list(r) for r in self.values[first - 1:last]]
+        # a API corta as linhas vazias do fim da faixa
+        while values and not any(values[-1]):
+            values.pop()
+        return values
+
+    @with_backoff(max_retries=6, base=1.0)
+    def row_values(self, row: int) -> list[str]:
+        self._chamada()
+        self._latencia(1)
+        return list(self.values[row - 1])
+
+    @with_backoff(max_retries=6, base=1.0)
+    def get_values(self, rng: str) -> list[list[str]]:
+        self._chamada()
+        values = self._ler(rng)
+        self._latencia(len(values))
+        return values
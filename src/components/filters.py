@@ -1,6 +1,55 @@
+from datetime import date
+
 import pandas as pd
 import streamlit as st
 
+from services.event_index import (
+    construir_indice,
+    faixa_periodo,
+    intersectar,
+    posicoes_selecao,
+    valores_presentes,
+)
+
+
+def periodo_selecionado(state_prefix: str = "default") -> tuple[date | None, date | None]:
+    """
+    Intervalo escolhido no filtro de período na última execução da página,
+    usado para recortar a base (load_events) antes de montar os filtros.
+    """
+    periodo = st.session_state.get(f"{state_prefix}_periodo")
+
+    if isinstance(periodo, (tuple, list)) and len(periodo) == 2:
+        inicio, fim = periodo
+        if inicio > fim:
+            inicio, fim = fim, inicio
+        return inicio, fim
+
+    return None, None
+
+
+def selecoes_ativas(
+    state_prefix: str,
+    tipo_col: str | None,
+    cliente_col: str | None,
+    forma_pagamento_col: str | None,
+    categoria_col: str | None = None,
+    produto_col: str | None = None,
+) -> dict:
+    """Seleções atuais dos multiselects de aplicar_filtros, no formato {coluna: valores}."""
+    dimensoes = {
+        "tipo": tipo_col,
+        "cliente": cliente_col,
+        "forma": forma_pagamento_col,
+        "categoria": categoria_col,
+        "produto": produto_col,
+    }
+    return {
+        col: list(st.session_state.get(f"{state_prefix}_filtro_{nome}", []))
+        for nome, col in dimensoes.items()
+        if col
+    }
+
 
 def aplicar_filtros(
     df: pd.DataFrame,
@@ -11,7 +60,18 @@ def aplicar_filtros(
     categoria_col: str | None = None,
     produto_col: str | None = None,
     state_prefix: str = "default",
+    limites_data: tuple[date, date] | None = None,
+    indice: dict | None = None,
 ) -> pd.DataFrame:
+    """
+    Monta os filtros em cascata na sidebar e devolve as linhas selecionadas.
+
+    Tudo é respondido pelo índice invertido (services.event_index) de df: o
+    período vira uma faixa de posições via searchsorted, cada seleção vira a
+    união das listas de posições dos valores, e as opções de cada multiselect
+    saem da interseção de todas as outras dimensões. Só o resultado final é
+    materializado como DataFrame. Sem indice, ele é montado na hora.
+    """
     def _state_key(nome: str) -> str:
         return f"{state_prefix}_{nome}"
 
@@ -20,67 +80,35 @@ def aplicar_filtros(
             return []
         return [x for x in selecionados if x in disponiveis]
 
-    def _aplicar(
-        base_df: pd.DataFrame,
-        inicio=None,
-        fim=None,
-        tipos=None,
-        clientes=None,
-        formas=None,
-        categorias=None,
-        produtos=None,
-    ) -> pd.DataFrame:
-        out = base_df.copy()
-
-        if data_col and inicio and fim and out[data_col].notna().any():
-            out = out[
-                (out[data_col].dt.date >= inicio) &
-                (out[data_col].dt.date <= fim)
-            ].copy()
-
-        if tipo_col and tipos:
-            out = out[out[tipo_col].astype(str).isin(tipos)].copy()
-
-        if cliente_col and clientes:
-            out = out[out[cliente_col].astype(str).isin(clientes)].copy()
-
-        if forma_pagamento_col and formas:
-            out = out[out[forma_pagamento_col].astype(str).isin(formas)].copy()
-
-        if categoria_col and categorias:
-            out = out[out[categoria_col].astype(str).isin(categorias)].copy()
-
-        if produto_col and produtos:
-            out = out[out[produto_col].astype(str).isin(produtos)].copy()
-
-        return out
-
-    tipo_key = _state_key("filtro_tipo")
-    cliente_key = _state_key("filtro_cliente")
-    forma_key = _state_key("filtro_forma")
-    categoria_key = _state_key("filtro_categoria")
-    produto_key = _state_key("filtro_produto")
-
-    if tipo_key not in st.session_state:
-        st.session_state[tipo_key] = []
-    if cliente_key not in st.session_state:
-        st.session_state[cliente_key] = []
-    if forma_key not in st.session_state:
-        st.session_state[forma_key] = []
-    if categoria_key not in st.session_state:
-        st.session_state[categoria_key] = []
-    if produto_key not in st.session_state:
-        st.session_state[produto_key] = []
+    dimensoes = [
+        ("tipo", tipo_col, "Tipo"),
+        ("cliente", cliente_col, "Cliente"),
+        ("forma", forma_pagamento_col, "Forma de pagamento"),
+        ("categoria", categoria_col, "Categoria"),
+        ("produto", produto_col, "Produto"),
+    ]
+    dimensoes = [(nome, col, rotulo) for nome, col, rotulo in dimensoes if col]
+
+    if indice is None:
+        if data_col:
+            # mantém os rótulos: tabela_paginada identifica as linhas por eles
+            df = df.sort_values(data_col, kind="stable", na_position="last")
+        indice = construir_indice(df, data_col, [col for _, col, _ in dimensoes])
+
+    for nome, _, _ in dimensoes:
+        if _state_key(f"filtro_{nome}") not in st.session_state:
+            st.session_state[_state_key(f"filtro_{nome}")] = []
 
     st.sidebar.header("Filtros")
 
-    df_base = df.copy()
-    inicio = None
-    fim = None
+    faixa = (0, indice["n_linhas"])
 
-    if data_col and df_base[data_col].notna().any():
-        data_min = df_base[data_col].dropna().min().date()
-        data_max = df_base[data_col].dropna().max().date()
+    if data_col and (limites_data or len(indice["datas"])):
+        if limites_data:
+            data_min, data_max = limites_data
+        else:
+            data_min = pd.Timestamp(indice["datas"][0]).date()
+            data_max = pd.Timestamp(indice["datas"][-1]).date()
 
         periodo = st.sidebar.date_input(
             "Período",
@@ -101,170 +129,33 @@ def aplicar_filtros(
             st.info("Selecione um intervalo de datas válido.")
             st.stop()
 
-    tipos_sel_atual = st.session_state[tipo_key]
-    clientes_sel_atual = st.session_state[cliente_key]
-    formas_sel_atual = st.session_state[forma_key]
-    categorias_sel_atual = st.session_state[categoria_key]
-    produtos_sel_atual = st.session_state[produto_key]
-
-    if tipo_col:
-        df_tipo = _aplicar(
-            df_base,
-            inicio=inicio,
-            fim=fim,
-            clientes=clientes_sel_atual,
-            formas=formas_sel_atual,
-            categorias=categorias_sel_atual,
-            produtos=produtos_sel_atual,
-        )
-
-        tipos_disponiveis = sorted(
-            df_tipo[tipo_col].dropna().astype(str).unique().tolist()
-        )
-
-        st.session_state[tipo_key] = _limpar_selecao_invalida(
-            st.session_state[tipo_key],
-            tipos_disponiveis,
-        )
-
-        st.sidebar.multiselect(
-            "Tipo",
-            options=tipos_disponiveis,
-            key=tipo_key,
-            placeholder="Selecione",
-        )
-
-    tipos_sel_atual = st.session_state[tipo_key]
-
-    if cliente_col:
-        df_cliente = _aplicar(
-            df_base,
-            inicio=inicio,
-            fim=fim,
-            tipos=tipos_sel_atual,
-            formas=formas_sel_atual,
-            categorias=categorias_sel_atual,
-            produtos=produtos_sel_atual,
-        )
-
-        clientes_disponiveis = sorted(
-            df_cliente[cliente_col].dropna().astype(str).unique().tolist()
-        )
-
-        st.session_state[cliente_key] = _limpar_selecao_invalida(
-            st.session_state[cliente_key],
-            clientes_disponiveis,
-        )
-
-        st.sidebar.multiselect(
-            "Cliente",
-            options=clientes_disponiveis,
-            key=cliente_key,
-            placeholder="Selecione",
-        )
+        if len(indice["datas"]):
+            faixa = faixa_periodo(indice, inicio, fim)
 
-    tipos_sel_atual = st.session_state[tipo_key]
-    clientes_sel_atual = st.session_state[cliente_key]
+    # posições de cada dimensão com seleção ativa (None = sem filtro)
+    conjuntos = {}
+    for nome, col, _ in dimensoes:
+        selecionados = st.session_state[_state_key(f"filtro_{nome}")]
+        conjuntos[nome] = posicoes_selecao(indice, col, selecionados) if selecionados else None
 
-    if forma_pagamento_col:
-        df_forma = _aplicar(
-            df_base,
-            inicio=inicio,
-            fim=fim,
-            tipos=tipos_sel_atual,
-            clientes=clientes_sel_atual,
-            categorias=categorias_sel_atual,
-            produtos=produtos_sel_atual,
-        )
-
-        formas_disponiveis = sorted(
-            df_forma[forma_pagamento_col].dropna().astype(str).unique().tolist()
-        )
-
-        st.session_state[forma_key] = _limpar_selecao_invalida(
-            st.session_state[forma_key],
-            formas_disponiveis,
-        )
-
-        st.sidebar.multiselect(
-            "Forma de pagamento",
-            options=formas_disponiveis,
-            key=forma_key,
-            placeholder="Selecione",
-        )
+    for nome, col, rotulo in dimensoes:
+        key = _state_key(f"filtro_{nome}")
+        outras = intersectar([c for n, c in conjuntos.items() if n != nome], faixa)
+        disponiveis = valores_presentes(indice, col, outras, faixa)
 
-    tipos_sel_atual = st.session_state[tipo_key]
-    clientes_sel_atual = st.session_state[cliente_key]
-    formas_sel_atual = st.session_state[forma_key]
-
-    if categoria_col:
-        df_categoria = _aplicar(
-            df_base,
-            inicio=inicio,
-            fim=fim,
-            tipos=tipos_sel_atual,
-            clientes=clientes_sel_atual,
-            formas=formas_sel_atual,
-            produtos=produtos_sel_atual,
-        )
-
-        categorias_disponiveis = sorted(
-            df_categoria[categoria_col].dropna().astype(str).unique().tolist()
-        )
-
-        st.session_state[categoria_key] = _limpar_selecao_invalida(
-            st.session_state[categoria_key],
-            categorias_disponiveis,
-        )
-
-        st.sidebar.multiselect(
-            "Categoria",
-            options=categorias_disponiveis,
-            key=categoria_key,
-            placeholder="Selecione",
-        )
-
-    tipos_sel_atual = st.session_state[tipo_key]
-    clientes_sel_atual = st.session_state[cliente_key]
-    formas_sel_atual = st.session_state[forma_key]
-    categorias_sel_atual = st.session_state[categoria_key]
-
-    if produto_col:
-        df_produto = _aplicar(
-            df_base,
-            inicio=inicio,
-            fim=fim,
-            tipos=tipos_sel_atual,
-            clientes=clientes_sel_atual,
-            formas=formas_sel_atual,
-            categorias=categorias_sel_atual,
-        )
-
-        produtos_disponiveis = sorted(
-            df_produto[produto_col].dropna().astype(str).unique().tolist()
-        )
-
-        st.session_state[produto_key] = _limpar_selecao_invalida(
-            st.session_state[produto_key],
-            produtos_disponiveis,
-        )
+        st.session_state[key] = _limpar_selecao_invalida(st.session_state[key], disponiveis)
 
         st.sidebar.multiselect(
-            "Produto",
-            options=produtos_disponiveis,
-            key=produto_key,
+            rotulo,
+            options=disponiveis,
+            key=key,
             placeholder="Selecione",
         )
 
-    work_df = _aplicar(
-        df_base,
-        inicio=inicio,
-        fim=fim,
-        tipos=st.session_state[tipo_key],
-        clientes=st.session_state[cliente_key],
-        formas=st.session_state[forma_key],
-        categorias=st.session_state[categoria_key],
-        produtos=st.session_state[produto_key],
-    )
+        selecionados = st.session_state[key]
+        conjuntos[nome] = posicoes_selecao(indice, col, selecionados) if selecionados else None
 
-    return work_df
\ No newline at end of file
+    linhas = intersectar(list(conjuntos.values()), faixa)
+    if linhas is None:
+        return df.iloc[faixa[0]:faixa[1]]
+    return df.iloc[linhas]
@@ -0,0 +1,142 @@
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+TAMANHOS_PAGINA = [50, 100, 250, 500]
+
+
+def janela_ordenada(
+    df: pd.DataFrame,
+    ordenar_por: str,
+    decrescente: bool,
+    inicio: int,
+    fim: int,
+    data_col: str | None = None,
+) -> pd.DataFrame:
+    """
+    Linhas [inicio, fim) de df ordenado por ordenar_por, sem ordenar o resto.
+
+    Pela data, df já vem em ordem crescente (datas nulas no fim) de
+    aplicar_filtros, então a janela é só aritmética de posições. Nas demais
+    colunas numéricas, nlargest/nsmallest selecionam apenas as fim primeiras
+    linhas. Nulos ficam sempre no fim, como em sort_values.
+    """
+    n_linhas = len(df)
+    fim = min(fim, n_linhas)
+    if inicio >= fim:
+        return df.iloc[0:0]
+
+    if ordenar_por == data_col:
+        datas = df[data_col]
+        n_validos = int(datas.notna().sum())
+        if datas.iloc[:n_validos].is_monotonic_increasing and not datas.iloc[n_validos:].notna().any():
+            posicoes = np.arange(inicio, fim)
+            if decrescente:
+                posicoes = np.where(posicoes < n_validos, n_validos - 1 - posicoes, posicoes)
+            return df.iloc[posicoes]
+
+    serie = df[ordenar_por]
+    if pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_datetime64_any_dtype(serie):
+        validos = serie.dropna()
+        if fim <= len(validos):
+            topo = validos.nlargest(fim) if decrescente else validos.nsmallest(fim)
+            return df.loc[topo.index[inicio:fim]]
+
+    return df.sort_values(ordenar_por, ascending=not decrescente, na_position="last").iloc[inicio:fim]
+
+
+def tabela_paginada(
+    df: pd.DataFrame,
+    colunas_ordenacao: list[str],
+    data_col: str | None = None,
+    state_prefix: str = "default",
+) -> pd.Series | None:
+    """
+    Mostra df paginado no servidor: só a página visível é ordenada, serializada
+    e enviada ao navegador. Devolve a linha selecionada ou None.
+
+    A seleção é guardada pelo rótulo da linha em df (o .name da linha
+    devolvida), não pela posição na página: com load_events, o rótulo é a
+    posição do registro na base da versão servida, o mesmo em qualquer
+    período, filtro, ordem ou página. A linha continua selecionada enquanto
+    estiver em df.
+    """
+    def _state_key(nome: str) -> str:
+        return f"{state_prefix}_{nome}"
+
+    c1, c2, c3, c4 = st.columns([2, 2, 1, 1])
+
+    ordenar_por = c1.selectbox("Ordenar por", colunas_ordenacao, key=_state_key("ordenar_por"))
+    direcao = c2.radio(
+        "Ordem",
+        ["Decrescente", "Crescente"],
+        horizontal=True,
+        key=_state_key("direcao"),
+    )
+    tamanho = c3.selectbox("Linhas por página", TAMANHOS_PAGINA, key=_state_key("tamanho_pagina"))
+
+    total_paginas = max(1, math.ceil(len(df) / tamanho))
+    pagina_key = _state_key("pagina")
+    if st.session_state.get(pagina_key, 1) > total_paginas:
+        st.session_state[pagina_key] = total_paginas
+
+    pagina = c4.number_input(
+        "Página",
+        min_value=1,
+        max_value=total_paginas,
+        step=1,
+        key=pagina_key,
+    )
+
+    inicio = (int(pagina) - 1) * tamanho
+    pagina_df = janela_ordenada(
+        df,
+        ordenar_por,
+        direcao == "Decrescente",
+        inicio,
+        inicio + tamanho,
+        data_col=data_col,
+    )
+
+    st.caption(
+        f"Página {int(pagina)} de {total_paginas} · "
+        f"registros {inicio + 1 if len(pagina_df) else 0}–{inicio + len(pagina_df)} de {len(df)}"
+    )
+
+    # a seleção do st.dataframe é a posição na página: quando a página passa a
+    # mostrar outras linhas, a tabela é outra (chave nova) e a seleção antiga
+    # não cai num registro diferente
+    tabela_key = _state_key(f"tabela_{hash(tuple(pagina_df.index.tolist()))}")
+    evento = st.dataframe(
+        pagina_df,
+        use_container_width=True,
+        hide_index=True,
+        selection_mode="single-row",
+        on_select="rerun",
+        key=tabela_key,
+    )
+
+    selected_rows = []
+    try:
+        selected_rows = evento.selection.get("rows", [])
+    except Exception:
+        selected_rows = []
+
+    selecionado_key = _state_key("selecionado")
+    marcadas = (tabela_key, [int(i) for i in selected_rows])
+    anterior = st.session_state.get(_state_key("marcadas"))
+    st.session_state[_state_key("marcadas")] = marcadas
+
+    if len(selected_rows) == 1 and int(selected_rows[0]) < len(pagina_df):
+        st.session_state[selecionado_key] = pagina_df.index[int(selected_rows[0])]
+    elif anterior is not None and anterior[0] == tabela_key and anterior[1]:
+        # a mesma tabela tinha uma linha marcada e não tem mais: seleção desfeita
+        st.session_state[selecionado_key] = None
+
+    rotulo = st.session_state.get(selecionado_key)
+    if rotulo is not None and rotulo in df.index:
+        return df.loc[rotulo]
+
+    return None
@@ -1,15 +1,45 @@
 from pathlib import Path
+import argparse
+import hashlib
 import os
 import json
+import re
+import shutil
 
-import gspread
-from google.oauth2.service_account import Credentials
+from gspread.utils import rowcol_to_a1
 import pandas as pd
-
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets.readonly",
-    "https://www.googleapis.com/auth/drive.readonly",
-]
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from services.event_schema import (
+    EXPORTED_AT_COL,
+    SCHEMA_VERSION,
+    build_schema,
+    resolve_columns,
+    schema_version,
+    to_typed_table,
+)
+from services.normalize import (
+    normalize_decimal_series,
+    normalize_integer_series,
+    normalize_text_series,
+)
+from services.sheets_client import (
+    BATCH_ROWS,
+    FETCH_WORKERS,
+    SCOPES_READONLY,
+    batch_get_values,
+    iter_row_ranges,
+    open_worksheet,
+    quota,
+)
+
+_HIVE_NULL = "__HIVE_DEFAULT_PARTITION__"
+
+# Partes gravadas por import_telegram_export.py (ids de mensagem, não linhas da planilha)
+IMPORT_PREFIX = "tg"
+IMPORT_PART = re.compile(rf"^{IMPORT_PREFIX}-(\d+)-(\d+)-0\.parquet$")
 
 
 def _get_required(name):
@@ -28,88 +58,94 @@ def _find_base_dir():
     return here_dir
 
 
-def connect_worksheet(sheet_id, worksheet_name, service_account_json):
-    service_account_info = json.loads(service_account_json)
-    creds = Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
-    gc = gspread.authorize(creds)
-    sh = gc.open_by_key(sheet_id)
-    ws = sh.worksheet(worksheet_name)
-    return ws
+def load_export_state(state_file):
+    try:
+        with open(state_file, "r", encoding="utf-8") as state_f:
+            state_data = json.load(state_f)
+            if "last_row" not in state_data:
+                state_data["last_row"] = 1
+            return state_data
+    except FileNotFoundError:
+        return {"last_row": 1}
 
 
-def normalize_text_series(series: pd.Series, lower: bool = False) -> pd.Series:
-    out = series.astype(str).str.strip()
-    out = out.replace({"": pd.NA, "nan": pd.NA, "None": pd.NA})
-    if lower:
-        out = out.str.lower()
-    return out
+def save_export_state(state_file, state_data):
+    state_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(state_file, "w", encoding="utf-8") as state_f:
+        json.dump(state_data, state_f)
 
 
-def normalize_decimal_series(series: pd.Series) -> pd.Series:
-    """
-    Trata valores como:
-    1234,56
-    1.234,56
-    1234.56
-    """
-    s = series.astype(str).str.strip()
-    s = s.replace({"": pd.NA, "nan": pd.NA, "None": pd.NA})
+def _col_letter(col_idx: int) -> str:
+    # Converte índice numérico de coluna (1-based) para letra A1
+    a1 = rowcol_to_a1(1, col_idx)
+    return a1.rstrip("0123456789")
 
-    # se tiver vírgula, assume padrão BR e remove pontos de milhar
-    has_comma = s.str.contains(",", na=False)
 
-    s_br = (
-        s.where(has_comma)
-        .astype("string")
-        .str.replace(".", "", regex=False)
-        .str.replace(",", ".", regex=False)
+def fetch_batches(
+    ws,
+    start_row: int,
+    n_cols: int,
+    batch_rows: int = BATCH_ROWS,
+    workers: int = FETCH_WORKERS,
+):
+    """
+    Lê a aba em faixas de batch_rows linhas (A2:J5001, A5002:J10001, ...) até o
+    fim da grade, buscadas em paralelo via batchGet (services.sheets_client) e
+    entregues em ordem, completando/cortando cada linha para ter exatamente
+    n_cols colunas. Gera (primeira linha da faixa, linhas) só para faixas com dados.
+    """
+    faixas = iter_row_ranges(
+        ws,
+        start_row,
+        ws.row_count,
+        _col_letter(n_cols),
+        batch_rows=batch_rows,
+        workers=workers,
     )
+    for first, values in faixas:
+        if values:
+            yield first, [(list(row) + [""] * n_cols)[:n_cols] for row in values]
 
-    s_en = s.where(~has_comma).astype("string")
-
-    s_final = s_en.fillna(s_br)
-    return pd.to_numeric(s_final, errors="coerce")
-
-
-def normalize_integer_series(series: pd.Series) -> pd.Series:
-    s = pd.to_numeric(series, errors="coerce")
-    return s.astype("Int64")
 
+def row_fingerprint(row: list) -> str:
+    """Hash dos valores de uma linha da planilha, já completada para n_cols colunas."""
+    return hashlib.sha256(json.dumps(row, ensure_ascii=False).encode("utf-8")).hexdigest()
 
-def main():
-    base_dir = _find_base_dir()
-    parquet_file = base_dir / "data" / "events.parquet"
-
-    sheet_id = _get_required("SHEET_ID")
-    worksheet_name = os.getenv("WORKSHEET_NAME", "Página1")
-    service_account_json = _get_required("GOOGLE_SERVICE_ACCOUNT_JSON")
-
-    print("Conectando à planilha...")
-    ws = connect_worksheet(sheet_id, worksheet_name, service_account_json)
 
-    values = ws.get_all_values()
-
-    if not values or len(values) <= 1:
-        print("Planilha vazia ou só com cabeçalho. Nada para exportar.")
-        return
-
-    header = values[0]
-    rows = values[1:]
-
-    df = pd.DataFrame(rows, columns=header)
+def last_row_unchanged(ws, state_data: dict, n_cols: int) -> bool:
+    """
+    Confere se a linha last_row da planilha ainda é a última exportada. Linhas
+    apagadas ou inseridas acima dela mudam o que está nessa posição, e o
+    incremental pularia ou releria registros. Estado sem a impressão digital
+    (exportações anteriores a ela) não tem como ser conferido e passa.
+    """
+    esperado = state_data.get("last_row_hash")
+    last_row = int(state_data.get("last_row", 1))
+    if esperado is None or last_row <= 1:
+        return True
+    (valores,) = batch_get_values(ws, [f"A{last_row}:{_col_letter(n_cols)}{last_row}"])
+    row = (list(valores[0]) + [""] * n_cols)[:n_cols] if valores else [""] * n_cols
+    return row_fingerprint(row) == esperado
 
-    # mapa de colunas tolerante a maiúsculas/minúsculas e acentos básicos
-    col_map = {str(c).lower().strip(): c for c in df.columns}
 
-    tipo_col = col_map.get("tipo")
-    cliente_col = col_map.get("cliente")
-    forma_pagamento_col = col_map.get("forma de pagamento") or col_map.get("forma_pagamento")
-    categoria_col = col_map.get("categoria")
-    produto_col = col_map.get("produto")
-    quantidade_col = col_map.get("quantidade")
-    descricao_col = col_map.get("descrição") or col_map.get("descricao")
-    valor_col = col_map.get("valor")
-    data_col = col_map.get("data")
+def normalize_events(df: pd.DataFrame, seen_ids: set | None = None) -> pd.DataFrame:
+    """
+    Normaliza os tipos das colunas e descarta linhas vazias ou sem valor. Com
+    seen_ids, descarta também as linhas cujo id de mensagem do Telegram já
+    apareceu (no próprio lote ou em seen_ids) e acrescenta os novos ao set.
+    """
+    columns = resolve_columns(df.columns)
+
+    tipo_col = columns["tipo"]
+    cliente_col = columns["cliente"]
+    forma_pagamento_col = columns["forma_pagamento"]
+    categoria_col = columns["categoria"]
+    produto_col = columns["produto"]
+    quantidade_col = columns["quantidade"]
+    descricao_col = columns["descricao"]
+    valor_col = columns["valor"]
+    data_col = columns["data"]
+    message_id_col = columns["message_id"]
 
     # ==========================================================
     # Normalizações
@@ -136,39 +172,368 @@ def main():
         df[quantidade_col] = normalize_integer_series(df[quantidade_col])
 
     if valor_col:
-        df[valor_col] = normalize_decimal_series(df[valor_col])
+        df[valor_col] = normalize_decimal_series(df[valor_col]).astype("float64")
 
     if data_col:
         df[data_col] = pd.to_datetime(df[data_col], errors="coerce")
 
+    if message_id_col:
+        df[message_id_col] = normalize_integer_series(df[message_id_col])
+
     # remove linhas totalmente vazias nas colunas principais
-    colunas_principais = [
-        c for c in [
-            tipo_col,
-            cliente_col,
-            forma_pagamento_col,
-            categoria_col,
-            produto_col,
-            quantidade_col,
-            descricao_col,
-            valor_col,
-            data_col,
-        ] if c is not None
-    ]
+    colunas_principais = [c for c in columns.values() if c is not None]
 
     if colunas_principais:
         df = df.dropna(how="all", subset=colunas_principais).copy()
 
+    # linhas sem valor não entram no dataset (o dashboard nunca as usa)
+    if valor_col:
+        df = df.dropna(subset=[valor_col]).copy()
+
+    # a mesma mensagem gravada duas vezes na planilha (ou já importada de um
+    # export) entra uma vez só; linhas do cadastro não têm id e ficam todas
+    if message_id_col and seen_ids is not None:
+        ids = df[message_id_col]
+        repetidas = ids.notna() & (ids.duplicated() | ids.isin(seen_ids))
+        if repetidas.any():
+            df = df[~repetidas].copy()
+        seen_ids.update(int(i) for i in df[message_id_col].dropna())
+
+    return df
+
+
+class PartitionWriter:
+    """
+    Grava os lotes da exportação no dataset particionado no estilo Hive por
+    ano/mês da coluna Data (data/events/ano=2026/mes=2/part-....parquet).
+
+    Cada partição tem um ParquetWriter aberto durante a exportação, e cada lote
+    vira um row group: só o lote atual fica em memória. Os arquivos são
+    gravados como .tmp e só ganham o nome final em close(), quando o intervalo
+    de linhas de origem (part-{primeira}-{última}-0.parquet) é conhecido; então
+    cada exportação incremental só acrescenta arquivos, nunca reescreve os
+    anteriores, e uma exportação interrompida não deixa partes pela metade.
+
+    prefix distingue a origem das partes: "part" para as linhas da planilha,
+    IMPORT_PREFIX para as importadas direto de um export do Telegram.
+    """
+
+    def __init__(self, dataset_dir: Path, first_row: int, prefix: str = "part"):
+        self.dataset_dir = dataset_dir
+        self.first_row = first_row
+        self.prefix = prefix
+        self.schema = None
+        self.writers = {}
+
+    def _tmp_path(self, partition_dir: Path) -> Path:
+        return partition_dir / f"{self.prefix}-{self.first_row:08d}.parquet.tmp"
+
+    def _writer_for(self, partition: str) -> pq.ParquetWriter:
+        if partition not in self.writers:
+            partition_dir = self.dataset_dir / partition
+            partition_dir.mkdir(parents=True, exist_ok=True)
+            self.writers[partition] = pq.ParquetWriter(str(self._tmp_path(partition_dir)), self.schema)
+        return self.writers[partition]
+
+    def write(self, df: pd.DataFrame):
+        if df.empty:
+            return
+
+        table = to_typed_table(df, build_schema(list(df.columns)))
+        if self.schema is None:
+            self.schema = table.schema
+
+        data_col = resolve_columns(table.column_names)["data"]
+        if not data_col:
+            self._writer_for("").write_table(table)
+            return
+
+        # linhas sem data vão para a partição ano=__HIVE_DEFAULT_PARTITION__
+        chave = pc.add(pc.multiply(pc.year(table[data_col]), 100), pc.month(table[data_col]))
+        for valor in pc.unique(chave).to_pylist():
+            if valor is None:
+                partition = f"ano={_HIVE_NULL}/mes={_HIVE_NULL}"
+                parte = table.filter(pc.is_null(chave))
+            else:
+                partition = f"ano={valor // 100}/mes={valor % 100}"
+                parte = table.filter(pc.equal(chave, valor))
+            self._writer_for(partition).write_table(parte)
+
+    def close(self, last_row: int):
+        for partition, writer in self.writers.items():
+            writer.close()
+            partition_dir = self.dataset_dir / partition
+            self._tmp_path(partition_dir).replace(
+                partition_dir / f"{self.prefix}-{self.first_row:08d}-{last_row:08d}-0.parquet"
+            )
+        self.writers = {}
+
+    def abort(self):
+        for partition, writer in self.writers.items():
+            writer.close()
+            self._tmp_path(self.dataset_dir / partition).unlink(missing_ok=True)
+        self.writers = {}
+
+
+def _clear_dataset(dataset_dir: Path):
+    if dataset_dir.exists():
+        shutil.rmtree(dataset_dir)
+
+
+def import_parts(dataset_dir: Path) -> list[Path]:
+    """Partes importadas de exports do Telegram (tg-{primeiro id}-{último id}-0.parquet)."""
+    if not dataset_dir.exists():
+        return []
+    return [f for f in sorted(dataset_dir.rglob("*.parquet")) if IMPORT_PART.match(f.name)]
+
+
+def _migrate_import(src: Path, dest: Path, schema):
+    # colunas da planilha atual (as que faltam ficam nulas, as que saíram são
+    # descartadas) e tipos do schema novo; a data não muda, nem a partição
+    df = pq.ParquetFile(src).read().to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+    for name in schema.names:
+        if name not in df.columns:
+            df[name] = pd.Series(pd.NA, index=df.index, dtype=object)
+    pq.write_table(to_typed_table(df, schema), dest)
+
+
+def _carry_over_imports(dataset_dir: Path, target_dir: Path, partes: list[Path], schema) -> int:
+    """
+    Leva para a reconstrução as partes importadas de exports do Telegram, que
+    não estão na planilha e se perderiam na troca: o state.json já passou
+    desses ids, então nada as buscaria de novo. As que têm o schema do dataset
+    novo são copiadas; as de um schema anterior (outras colunas ou outra
+    versão) são convertidas. Se uma não puder ser convertida, a exceção sobe
+    antes da troca e o dataset anterior fica como estava.
+    """
+    mantidas = 0
+    for f in partes:
+        dest = target_dir / f.relative_to(dataset_dir)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        file_schema = pq.read_schema(f)
+        if file_schema.names == schema.names and schema_version(file_schema) == SCHEMA_VERSION:
+            shutil.copy2(f, dest)
+        else:
+            try:
+                _migrate_import(f, dest, schema)
+            except (pa.ArrowException, ValueError, TypeError) as e:
+                raise RuntimeError(
+                    f"Parte importada {f} não pôde ser convertida para as colunas atuais da "
+                    "planilha; reconstrução cancelada, o dataset anterior foi mantido."
+                ) from e
+            print("Parte importada convertida para o schema atual:", f.name)
+        mantidas += 1
+    return mantidas
+
+
+def _dataset_schema(dataset_dir: Path):
+    parts = sorted(dataset_dir.rglob("*.parquet")) if dataset_dir.exists() else []
+    if not parts:
+        return None
+    return pq.read_schema(parts[0])
+
+
+def existing_message_ids(files, only=None) -> set:
+    """
+    Ids de mensagem do Telegram já gravados nas partes, lendo só essa coluna.
+    Com only, procura apenas esses ids: partes e row groups cujas estatísticas
+    não cobrem o intervalo deles nem são lidos.
+    """
+    if only is not None:
+        only = sorted(only)
+        if not only:
+            return set()
+    ids = set()
+    for f in files:
+        message_id_col = resolve_columns(pq.read_schema(f).names)["message_id"]
+        if not message_id_col:
+            continue
+        filtro = None
+        if only is not None:
+            campo = pc.field(message_id_col)
+            filtro = (campo >= only[0]) & (campo <= only[-1]) & campo.isin(only)
+        coluna = pq.read_table(f, columns=[message_id_col], filters=filtro).column(0)
+        ids.update(i for i in coluna.to_pylist() if i is not None)
+    return ids
+
+
+def max_message_id(files) -> int:
+    """Maior id de mensagem nas partes, pelas estatísticas dos row groups (sem ler os dados)."""
+    maior = 0
+    for f in files:
+        meta = pq.ParquetFile(f).metadata
+        names = meta.schema.to_arrow_schema().names
+        message_id_col = resolve_columns(names)["message_id"]
+        if not message_id_col:
+            continue
+        idx = names.index(message_id_col)
+        for rg in range(meta.num_row_groups):
+            stats = meta.row_group(rg).column(idx).statistics
+            if stats is not None and stats.has_min_max:
+                maior = max(maior, int(stats.max))
+            elif stats is None or stats.null_count != meta.row_group(rg).num_rows:
+                # sem estatísticas: lê a coluna desse arquivo
+                coluna = pq.read_table(f, columns=[message_id_col]).column(0)
+                maior = max([maior] + [i for i in coluna.to_pylist() if i is not None])
+                break
+    return maior
+
+
+def _ids_already_written(df: pd.DataFrame, watermark: int, seen_ids: set, parts) -> set:
+    # só ids até a marca podem já estar no dataset; acima dela são mensagens novas
+    message_id_col = resolve_columns(df.columns)["message_id"]
+    if not message_id_col or not watermark:
+        return set()
+    ids = normalize_integer_series(df[message_id_col]).dropna()
+    candidatos = {int(i) for i in ids if i <= watermark} - seen_ids
+    return existing_message_ids(parts, only=candidatos)
+
+
+def main(full_rebuild: bool = False, batch_size: int = BATCH_ROWS, workers: int = FETCH_WORKERS):
+    base_dir = _find_base_dir()
+    dataset_dir = base_dir / "data" / "events"
+    state_file = base_dir / "data" / "state_export.json"
+
+    sheet_id = _get_required("SHEET_ID")
+    worksheet_name = os.getenv("WORKSHEET_NAME", "Página1")
+    service_account_json = _get_required("GOOGLE_SERVICE_ACCOUNT_JSON")
+
+    print("Conectando à planilha...")
+    ws = open_worksheet(sheet_id, worksheet_name, service_account_json, scopes=SCOPES_READONLY)
+
+    header = [str(h) for h in ws.row_values(1)]
+
+    if not header:
+        print("Planilha vazia ou só com cabeçalho. Nada para exportar.")
+        return
+
+    state_data = load_export_state(state_file)
+    schema = _dataset_schema(dataset_dir)
+
+    if not full_rebuild:
+        if schema is None:
+            print("Dataset inexistente. Fazendo reconstrução completa.")
+            full_rebuild = True
+        elif state_data.get("header") != header:
+            print("Cabeçalho da planilha mudou. Fazendo reconstrução completa.")
+            full_rebuild = True
+        elif schema_version(schema) != SCHEMA_VERSION:
+            print("Versão do schema mudou. Fazendo reconstrução completa.")
+            full_rebuild = True
+        elif not last_row_unchanged(ws, state_data, len(header)):
+            print(
+                "A linha", state_data["last_row"], "da planilha não é mais a última exportada "
+                "(linhas apagadas ou inseridas acima dela). Fazendo reconstrução completa."
+            )
+            full_rebuild = True
+
+    last_row = 1 if full_rebuild else int(state_data.get("last_row", 1))
+    start_row = last_row + 1
+    print("Modo:", "completo" if full_rebuild else "incremental", "| a partir da linha:", start_row)
+
+    # reconstrução completa grava num diretório à parte e só troca no fim:
+    # se a exportação falhar no meio, o dataset anterior continua intacto
+    target_dir = dataset_dir.with_name("events.tmp") if full_rebuild else dataset_dir
+    if full_rebuild:
+        _clear_dataset(target_dir)
+
+    # ids de mensagem já no dataset. Na reconstrução são só os das partes
+    # importadas que continuam valendo; no incremental, max_message_id (salvo
+    # junto de last_row) separa as mensagens novas das que podem ser repetidas,
+    # e só estas são procuradas nas partes, lote a lote
+    partes = []
+    watermark = 0
+    if full_rebuild:
+        importadas = import_parts(dataset_dir)
+        seen_ids = existing_message_ids(importadas)
+    else:
+        seen_ids = set()
+        partes = sorted(dataset_dir.rglob("*.parquet"))
+        if "max_message_id" in state_data:
+            watermark = int(state_data["max_message_id"])
+        else:
+            watermark = max_message_id(partes)
+
     exported_at = pd.Timestamp.now(tz="America/Sao_Paulo")
-    df["Data/Hora da Exportação"] = exported_at
+    writer = PartitionWriter(target_dir, start_row)
+    end_row = None
+    ultima = None
+    n_lidas = n_exportados = 0
+    colunas = []
+
+    try:
+        for first, rows in fetch_batches(ws, start_row, len(header), batch_size, workers):
+            end_row = first + len(rows) - 1
+            ultima = rows[-1]
+            n_lidas += len(rows)
+
+            df = pd.DataFrame(rows, columns=header)
+            seen_ids |= _ids_already_written(df, watermark, seen_ids, partes)
+            df = normalize_events(df, seen_ids)
+            df[EXPORTED_AT_COL] = exported_at
+            writer.write(df)
+
+            n_exportados += len(df)
+            colunas = list(df.columns)
+            print("Lote até a linha", end_row, "| registros:", len(df))
+    except BaseException:
+        writer.abort()
+        if full_rebuild:
+            _clear_dataset(target_dir)
+        raise
+
+    if end_row is None:
+        print("Nenhuma linha nova na planilha. Nada para exportar.")
+        return
+
+    writer.close(end_row)
+
+    if full_rebuild:
+        try:
+            mantidas = _carry_over_imports(dataset_dir, target_dir, importadas, build_schema(header))
+        except BaseException:
+            _clear_dataset(target_dir)
+            raise
+        if mantidas:
+            print("Partes importadas do Telegram mantidas:", mantidas)
+        _clear_dataset(dataset_dir)
+        if target_dir.exists():
+            target_dir.rename(dataset_dir)
+
+    if n_exportados:
+        print("Dataset atualizado em: " + str(dataset_dir))
 
-    parquet_file.parent.mkdir(parents=True, exist_ok=True)
-    df.to_parquet(parquet_file, index=False)
+    state_data["last_row"] = end_row
+    state_data["last_row_hash"] = row_fingerprint(ultima)
+    state_data["header"] = header
+    state_data["max_message_id"] = max(watermark, max(seen_ids, default=0))
+    save_export_state(state_file, state_data)
 
-    print("Exportação concluída. Arquivo salvo em: " + str(parquet_file))
-    print("Quantidade de registros exportados:", len(df))
-    print("Colunas exportadas:", list(df.columns))
+    print("Exportação concluída. Linhas lidas da planilha:", n_lidas)
+    print("Quantidade de registros exportados:", n_exportados)
+    print("Colunas exportadas:", colunas)
+    print("last_row atualizado:", end_row)
+    print(quota.summary())
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Exporta a planilha para o dataset Parquet.")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="reconstrói o dataset inteiro em vez de exportar só as linhas novas",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=BATCH_ROWS,
+        help=f"linhas da planilha lidas e gravadas por vez (padrão: {BATCH_ROWS})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=FETCH_WORKERS,
+        help=f"chamadas batchGet simultâneas à planilha (padrão: {FETCH_WORKERS})",
+    )
+    args = parser.parse_args()
+    main(full_rebuild=args.full, batch_size=args.batch_size, workers=args.workers)
@@ -0,0 +1,289 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import os
+import re
+
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from export_to_parquet import (
+    IMPORT_PART,
+    IMPORT_PREFIX,
+    PartitionWriter,
+    _dataset_schema,
+    _find_base_dir,
+    existing_message_ids,
+    import_parts,
+    load_export_state,
+    normalize_events,
+    save_export_state,
+)
+from services.event_schema import EXPORTED_AT_COL, MESSAGE_ID_COL, resolve_columns
+from services.telegram_parser import FIELDS, message_row
+from telegram_to_sheets import load_state, save_state
+
+# Importação offline de um export do Telegram Desktop (result.json) direto
+# para o dataset Parquet, sem passar pela API do Telegram nem pela planilha.
+# O JSON é lido aos pedaços (json.JSONDecoder.raw_decode, uma mensagem por
+# vez), as mensagens vão em blocos para processos que rodam o parser e cada
+# bloco vira um row group nas partes tg-{primeiro id}-{último id}-0.parquet.
+# No fim, o state.json recebe o maior id do export, e o telegram_to_sheets
+# continua dali. Mensagens que já vieram da planilha (pelo id) não entram de
+# novo; dentro do intervalo de ids do export, ele substitui as partes tg-*
+# de importações anteriores (um export maior do mesmo canal não duplica nada).
+
+CHUNK_MESSAGES = 20000
+READ_BYTES = 1 << 20
+
+_WHITESPACE_COMMA = re.compile(r"[\s,]*")
+
+
+def iter_export_messages(path: Path, read_bytes: int = READ_BYTES):
+    """
+    Mensagens da lista "messages" do result.json, uma a uma, sem carregar o
+    arquivo inteiro: só o trecho ainda não decodificado fica em memória.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        while True:
+            m = re.search(r'"messages"\s*:\s*\[', buf)
+            if m:
+                buf = buf[m.end():]
+                break
+            more = f.read(read_bytes)
+            if not more:
+                raise ValueError("Lista \"messages\" não encontrada em " + str(path))
+            buf += more
+
+        pos = 0
+        while True:
+            pos = _WHITESPACE_COMMA.match(buf, pos).end()
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                msg, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # mensagem cortada no fim do pedaço lido: junta o próximo
+                more = f.read(read_bytes)
+                if not more:
+                    raise
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            yield msg
+            if pos >= read_bytes:
+                buf = buf[pos:]
+                pos = 0
+
+
+def message_text(msg: dict) -> str:
+    # "text" vem como string ou como lista de trechos (string ou {"type", "text"})
+    text = msg.get("text", "")
+    if isinstance(text, list):
+        text = "".join(t if isinstance(t, str) else t.get("text", "") for t in text)
+    return text.strip()
+
+
+def parse_chunk(chunk: list[tuple[int, str, str]]) -> tuple[int, list[list]]:
+    """Roda nos processos: (id, texto, data do envio) -> (último id, linhas na ordem de FIELDS + id)."""
+    rows = []
+    for msg_id, text, sent_date in chunk:
+        row = message_row(text, sent_date)
+        if row is not None:
+            rows.append(row + [msg_id])
+    return chunk[-1][0], rows
+
+
+def iter_chunks(path: Path, chunk_messages: int, ids: dict):
+    """Blocos de (id, texto, data) das mensagens com texto; ids guarda o menor e o maior id vistos."""
+    chunk = []
+    for msg in iter_export_messages(path):
+        msg_id = msg.get("id")
+        if not isinstance(msg_id, int):
+            continue
+        ids["first"] = msg_id if ids["first"] is None else min(ids["first"], msg_id)
+        ids["last"] = max(ids["last"], msg_id)
+        if msg.get("type") != "message":
+            continue
+        text = message_text(msg)
+        if text:
+            chunk.append((msg_id, text, str(msg.get("date", ""))[:10]))
+            if len(chunk) >= chunk_messages:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_parsed(pool, chunks, workers: int):
+    """Resultados de parse_chunk em ordem, com no máximo 2 blocos por processo em voo."""
+    pendentes = deque()
+    for chunk in chunks:
+        pendentes.append(pool.submit(parse_chunk, chunk))
+        if len(pendentes) >= workers * 2:
+            yield pendentes.popleft().result()
+    while pendentes:
+        yield pendentes.popleft().result()
+
+
+def dataset_columns(dataset_dir: Path, export_state_file: Path) -> list[str]:
+    """Colunas das partes importadas: as mesmas do dataset, para o schema bater."""
+    schema = _dataset_schema(dataset_dir)
+    if schema is not None:
+        return [c for c in schema.names if c != EXPORTED_AT_COL]
+    header = load_export_state(export_state_file).get("header")
+    return header or list(FIELDS) + [MESSAGE_ID_COL]
+
+
+def _sheet_ids(dataset_dir: Path) -> set:
+    # ids das partes vindas da planilha; as importadas são resolvidas por intervalo no fim
+    if not dataset_dir.exists():
+        return set()
+    return existing_message_ids(
+        f for f in sorted(dataset_dir.rglob("*.parquet")) if not IMPORT_PART.match(f.name)
+    )
+
+
+def replace_overlapping_imports(parts: list[Path], first_id: int, last_id: int, written: set) -> tuple[int, int]:
+    """
+    Tira das partes de importações anteriores as mensagens com id entre
+    first_id e last_id, que a importação atual acabou de gravar. Partes que
+    ficam vazias são apagadas; as outras são regravadas só com os ids de fora
+    do intervalo, com o nome refeito. written são os caminhos das partes novas
+    (que já substituíram as de mesmo nome). Devolve (apagadas, recortadas).
+    """
+    apagadas = recortadas = 0
+    for f in parts:
+        if f in written or not f.exists():
+            continue
+        m = IMPORT_PART.match(f.name)
+        part_first, part_last = int(m.group(1)), int(m.group(2))
+        if part_last < first_id or part_first > last_id:
+            continue
+
+        table = pq.ParquetFile(f).read()
+        message_id_col = resolve_columns(table.column_names)["message_id"]
+        if message_id_col is None:
+            # importação sem a coluna de ids: só dá para trocar a parte inteira
+            if first_id <= part_first and part_last <= last_id:
+                f.unlink()
+                apagadas += 1
+            continue
+
+        ids = table[message_id_col]
+        fora = pc.or_kleene(
+            pc.is_null(ids),
+            pc.or_(pc.less(ids, first_id), pc.greater(ids, last_id)),
+        )
+        manter = table.filter(fora)
+        if manter.num_rows == table.num_rows:
+            continue
+        if manter.num_rows == 0:
+            f.unlink()
+            apagadas += 1
+            continue
+
+        restantes = manter[message_id_col]
+        novo_first = pc.min(restantes).as_py() or part_first
+        novo_last = pc.max(restantes).as_py() or part_last
+        dest = f.with_name(f"{IMPORT_PREFIX}-{novo_first:08d}-{novo_last:08d}-0.parquet")
+        tmp = f.with_name(f.name + ".tmp")
+        pq.write_table(manter, tmp)
+        tmp.replace(dest)
+        if dest != f:
+            f.unlink()
+        recortadas += 1
+    return apagadas, recortadas
+
+
+def main(export_path: Path, chunk_messages: int = CHUNK_MESSAGES, workers: int | None = None):
+    base_dir = _find_base_dir()
+    dataset_dir = base_dir / "data" / "events"
+    state_file = base_dir / "data" / "state.json"
+    workers = workers or os.cpu_count() or 1
+
+    export_state_file = base_dir / "data" / "state_export.json"
+    columns = dataset_columns(dataset_dir, export_state_file)
+    print("Importando:", export_path, "| processos:", workers, "| colunas:", columns)
+
+    exported_at = pd.Timestamp.now(tz="America/Sao_Paulo")
+    ids = {"first": None, "last": 0}
+    writer = None
+    seen_ids = _sheet_ids(dataset_dir)
+    anteriores = import_parts(dataset_dir)
+    n_linhas = 0
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk_last_id, rows in iter_parsed(pool, iter_chunks(export_path, chunk_messages, ids), workers):
+                if writer is None:
+                    writer = PartitionWriter(dataset_dir, ids["first"], prefix=IMPORT_PREFIX)
+                if not rows:
+                    continue
+
+                df = pd.DataFrame(rows, columns=list(FIELDS) + [MESSAGE_ID_COL])
+                df = normalize_events(df.reindex(columns=columns, fill_value=""), seen_ids)
+                df[EXPORTED_AT_COL] = exported_at
+                writer.write(df)
+
+                n_linhas += len(df)
+                print("Bloco importado | registros:", len(df), "| até o id:", chunk_last_id)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+
+    if writer is None or not n_linhas:
+        print("Nenhum lançamento encontrado no export.")
+    else:
+        # mesmo export importado de novo regrava as mesmas partes; as de
+        # outros exports que cruzam o intervalo perdem os ids regravados
+        nome = f"{IMPORT_PREFIX}-{ids['first']:08d}-{ids['last']:08d}-0.parquet"
+        novas = {dataset_dir / partition / nome for partition in writer.writers}
+        writer.close(ids["last"])
+        apagadas, recortadas = replace_overlapping_imports(anteriores, ids["first"], ids["last"], novas)
+        if apagadas or recortadas:
+            print("Partes de importações anteriores substituídas:", apagadas, "| recortadas:", recortadas)
+        # a marca de ids do export_to_parquet tem de cobrir as mensagens
+        # importadas, senão uma repetida na planilha passaria sem checagem
+        export_state = load_export_state(export_state_file)
+        if int(export_state.get("max_message_id", ids["last"])) < ids["last"]:
+            export_state["max_message_id"] = ids["last"]
+            save_export_state(export_state_file, export_state)
+        print("Dataset atualizado em: " + str(dataset_dir))
+
+    state_data = load_state(state_file)
+    if ids["last"] > int(state_data.get("last_id", 0)):
+        state_data["last_id"] = ids["last"]
+        save_state(state_file, state_data)
+        print("state.json: last_id =", ids["last"])
+    else:
+        print("state.json já está adiante do export: last_id =", state_data["last_id"])
+
+    print("Importação concluída. Registros:", n_linhas)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Importa um export do Telegram Desktop (result.json) direto para o dataset Parquet."
+    )
+    parser.add_argument("export", type=Path, help="caminho do result.json")
+    parser.add_argument(
+        "--chunk",
+        type=int,
+        default=CHUNK_MESSAGES,
+        help=f"mensagens por bloco enviado aos processos e por row group (padrão: {CHUNK_MESSAGES})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="processos do parser (padrão: número de CPUs)",
+    )
+    args = parser.parse_args()
+    main(args.export, chunk_messages=args.chunk, workers=args.workers)
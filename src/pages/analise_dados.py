@@ -1,16 +1,29 @@
-import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
 
-from components.filters import aplicar_filtros
-from services.data_loader import load_events, format_brl
+from components.filters import aplicar_filtros, periodo_selecionado, selecoes_ativas
+from services.data_loader import (
+    format_brl,
+    load_date_bounds,
+    load_event_index,
+    load_events,
+    load_period_series,
+)
+from services.kpis import load_kpis
+from services.periodos import GRANULARIDADES
 
 
 st.title("Análise de Dados")
 st.caption("Visão analítica dos dados financeiros")
 
+limites_data = load_date_bounds()
+inicio, fim = periodo_selecionado("analise")
+if inicio is None and limites_data:
+    # primeira execução: o período padrão do filtro é a base inteira
+    inicio, fim = limites_data
+
 try:
-    df, cols = load_events()
+    df, cols, signature = load_events(inicio=inicio, fim=fim)
 except FileNotFoundError as e:
     st.warning(str(e))
     st.stop()
@@ -30,7 +43,10 @@ if not data_col:
     st.warning("A base não possui coluna de data.")
     st.stop()
 
-df = df.dropna(subset=[data_col, valor_col]).copy()
+# linhas sem data ficam fora do filtro de período; sem nenhuma data não há o que analisar
+if not df[data_col].notna().any():
+    st.info("Nenhum registro encontrado com os filtros aplicados.")
+    st.stop()
 
 work_df = aplicar_filtros(
     df=df,
@@ -41,62 +57,34 @@ work_df = aplicar_filtros(
     categoria_col=categoria_col,
     produto_col=produto_col,
     state_prefix="analise",
+    limites_data=limites_data,
+    indice=load_event_index(inicio=inicio, fim=fim, signature=signature),
 )
 
 if work_df.empty:
     st.info("Nenhum registro encontrado com os filtros aplicados.")
     st.stop()
 
-
-def preparar_periodo(base_df: pd.DataFrame, granularidade: str) -> tuple[pd.DataFrame, str]:
-    out = base_df.copy()
-
-    if granularidade == "Semana":
-        out["periodo"] = out[data_col].dt.to_period("W").apply(lambda r: r.start_time)
-        titulo_x = "Semana"
-    elif granularidade == "Mês":
-        out["periodo"] = out[data_col].dt.to_period("M").dt.to_timestamp()
-        titulo_x = "Mês"
-    elif granularidade == "Trimestre":
-        out["periodo"] = out[data_col].dt.to_period("Q").dt.to_timestamp()
-        titulo_x = "Trimestre"
-    else:
-        out["periodo"] = out[data_col].dt.to_period("Y").dt.to_timestamp()
-        titulo_x = "Ano"
-
-    return out, titulo_x
-
-
-def criar_labels(base_df: pd.DataFrame, granularidade: str) -> pd.DataFrame:
-    out = base_df.copy()
-
-    if granularidade == "Semana":
-        out["label"] = out["periodo"].dt.strftime("%d/%m/%Y")
-    elif granularidade == "Mês":
-        out["label"] = out["periodo"].dt.strftime("%m/%Y")
-    elif granularidade == "Trimestre":
-        out["label"] = (
-            "T"
-            + out["periodo"].dt.quarter.astype(str)
-            + "/"
-            + out["periodo"].dt.year.astype(str)
-        )
-    else:
-        out["label"] = out["periodo"].dt.strftime("%Y")
-
-    return out
+# Os dois gráficos usam a mesma série por período, calculada uma vez
+# sobre o cubo diário filtrado e memoizada por (filtro, granularidade)
+selecoes = selecoes_ativas(
+    "analise",
+    tipo_col,
+    cliente_col,
+    forma_pagamento_col,
+    categoria_col,
+    produto_col,
+)
 
 
 # KPI
-entradas = work_df.loc[work_df[tipo_col] == "entrada", valor_col].sum()
-saidas = work_df.loc[work_df[tipo_col].isin(["saída", "saida"]), valor_col].sum()
-saldo = entradas - saidas
+kpis = load_kpis(work_df, signature, tipo_col, valor_col, inicio, fim, selecoes)
 
 k1, k2, k3, k4 = st.columns(4)
-k1.metric("Entradas", format_brl(entradas))
-k2.metric("Saídas", format_brl(saidas))
-k3.metric("Saldo", format_brl(saldo))
-k4.metric("Registros", f"{len(work_df)}")
+k1.metric("Entradas", format_brl(kpis["entradas"]))
+k2.metric("Saídas", format_brl(kpis["saidas"]))
+k3.metric("Saldo", format_brl(kpis["saldo"]))
+k4.metric("Registros", f"{kpis['registros']}")
 
 st.divider()
 
@@ -105,37 +93,13 @@ st.subheader("Evolução de Entradas e Saídas")
 
 granularidade_evolucao = st.radio(
     "Exibir por:",
-    options=["Semana", "Mês", "Trimestre", "Ano"],
+    options=GRANULARIDADES,
     horizontal=True,
     key="radio_evolucao",
 )
 
-grafico_df_base, titulo_x = preparar_periodo(work_df, granularidade_evolucao)
-
-df_entrada = grafico_df_base[grafico_df_base[tipo_col] == "entrada"].copy()
-df_saida = grafico_df_base[grafico_df_base[tipo_col].isin(["saída", "saida"])].copy()
-
-entrada_agg = (
-    df_entrada.groupby("periodo", as_index=False)[valor_col]
-    .sum()
-    .rename(columns={valor_col: "entrada"})
-)
-
-saida_agg = (
-    df_saida.groupby("periodo", as_index=False)[valor_col]
-    .sum()
-    .rename(columns={valor_col: "saida"})
-)
-
-grafico_df = pd.merge(
-    entrada_agg,
-    saida_agg,
-    on="periodo",
-    how="outer",
-).fillna(0)
-
-grafico_df = grafico_df.sort_values("periodo").reset_index(drop=True)
-grafico_df = criar_labels(grafico_df, granularidade_evolucao)
+grafico_df = load_period_series(inicio, fim, selecoes, granularidade_evolucao, signature=signature)
+titulo_x = granularidade_evolucao
 
 fig1 = go.Figure()
 
@@ -198,38 +162,13 @@ st.subheader("Percentual de Lucro")
 
 granularidade_lucro = st.radio(
     "Exibir por:",
-    options=["Semana", "Mês", "Trimestre", "Ano"],
+    options=GRANULARIDADES,
     horizontal=True,
     key="radio_lucro",
 )
 
-base_lucro_df, titulo_x_lucro = preparar_periodo(work_df, granularidade_lucro)
-
-df_entrada_lucro = base_lucro_df[base_lucro_df[tipo_col] == "entrada"].copy()
-df_saida_lucro = base_lucro_df[base_lucro_df[tipo_col].isin(["saída", "saida"])].copy()
-
-entrada_agg_lucro = (
-    df_entrada_lucro.groupby("periodo", as_index=False)[valor_col]
-    .sum()
-    .rename(columns={valor_col: "entrada"})
-)
-
-saida_agg_lucro = (
-    df_saida_lucro.groupby("periodo", as_index=False)[valor_col]
-    .sum()
-    .rename(columns={valor_col: "saida"})
-)
-
-base = pd.merge(entrada_agg_lucro, saida_agg_lucro, on="periodo", how="outer").fillna(0)
-base["lucro"] = base["entrada"] - base["saida"]
-base["perc_lucro"] = base.apply(
-    lambda row: ((row["lucro"] / row["entrada"]) * 100) if row["entrada"] != 0 else 0,
-    axis=1,
-)
-
-base = base.sort_values("periodo").reset_index(drop=True)
-base = criar_labels(base, granularidade_lucro)
-base["cor"] = base["perc_lucro"].apply(lambda x: "green" if x >= 0 else "red")
+base = load_period_series(inicio, fim, selecoes, granularidade_lucro, signature=signature)
+titulo_x_lucro = granularidade_lucro
 
 fig2 = go.Figure()
 
@@ -1,9 +1,18 @@
 from datetime import date
 
-import gspread
+import numpy as np
 import pandas as pd
 import streamlit as st
-from google.oauth2.service_account import Credentials
+
+from services.data_loader import find_base_dir
+from services.event_schema import resolve_columns
+from services.normalize import (
+    normalize_decimal_series,
+    normalize_integer_series,
+    normalize_text_series,
+)
+from services.sheets_client import open_worksheet
+from services.write_queue import WriteQueue
 
 
 st.title("Cadastro de Lançamentos")
@@ -12,11 +21,6 @@ st.caption("Registre um novo lançamento com campos padronizados.")
 # ==========================================================
 # CONFIGURAÇÕES
 # ==========================================================
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive",
-]
-
 TIPOS = ["entrada", "saida"]
 
 CLIENTES = [
@@ -46,29 +50,40 @@ PRODUTOS = [
     "produto 3",
 ]
 
+# Importação em lote: linhas por chamada append_rows (10 mil linhas = 5 chamadas)
+IMPORT_CHUNK_ROWS = 2000
+
 # ==========================================================
 # CONEXÃO GOOGLE SHEETS
 # ==========================================================
-@st.cache_resource
-def conectar_google_sheets():
-    creds = Credentials.from_service_account_info(
+def obter_aba():
+    # cliente e aba ficam em cache no processo (services.sheets_client): salvar
+    # um lançamento não reabre a planilha nem relê os metadados
+    return open_worksheet(
+        st.secrets["google_sheets"]["spreadsheet_id"],
+        st.secrets["google_sheets"]["worksheet_name"],
         st.secrets["gcp_service_account"],
-        scopes=SCOPES,
     )
-    client = gspread.authorize(creds)
-    return client
 
 
-def obter_aba():
-    client = conectar_google_sheets()
-    planilha = client.open_by_key(st.secrets["google_sheets"]["spreadsheet_id"])
-    aba = planilha.worksheet(st.secrets["google_sheets"]["worksheet_name"])
-    return aba
+@st.cache_resource
+def obter_fila() -> WriteQueue:
+    # Uma fila (data/cadastro_queue.sqlite) e uma thread de envio por processo.
+    # A configuração é lida aqui, na thread do script, e não na de envio.
+    spreadsheet_id = st.secrets["google_sheets"]["spreadsheet_id"]
+    worksheet_name = st.secrets["google_sheets"]["worksheet_name"]
+    service_account = dict(st.secrets["gcp_service_account"])
 
+    fila = WriteQueue(find_base_dir() / "data" / "cadastro_queue.sqlite")
+    fila.start_worker(lambda: open_worksheet(spreadsheet_id, worksheet_name, service_account))
+    return fila
 
-def salvar_lancamento_google_sheets(registro: dict):
-    aba = obter_aba()
 
+def salvar_lancamento_google_sheets(registro: dict) -> int:
+    """
+    Coloca o lançamento na fila local e volta na hora; a thread de envio junta
+    os pendentes e grava na planilha em lote. Devolve o id na fila.
+    """
     linha = [
         registro["tipo"],
         registro["cliente"],
@@ -81,7 +96,225 @@ def salvar_lancamento_google_sheets(registro: dict):
         registro["data"],
     ]
 
-    aba.append_row(linha, value_input_option="USER_ENTERED")
+    return obter_fila().enqueue(linha)
+
+
+STATUS_LABELS = {
+    "pending": "⏳ Pendente",
+    "sending": "📤 Enviando",
+    "flushed": "✅ Enviado",
+    "failed": "❌ Falhou",
+}
+
+
+@st.fragment(run_every="3s")
+def status_envio():
+    ids = st.session_state.get("cadastro_ids_fila", [])
+    status = obter_fila().status(ids)
+    contagem = status["counts"]
+
+    pendentes = contagem.get("pending", 0) + contagem.get("sending", 0)
+    falhas = contagem.get("failed", 0)
+    if not ids and not pendentes and not falhas:
+        return
+
+    st.subheader("Envio para a planilha")
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Na fila", pendentes)
+    c2.metric("Enviados", contagem.get("flushed", 0))
+    c3.metric("Com falha", falhas)
+
+    if falhas and st.button("Reenviar lançamentos com falha", key="cadastro_reenviar"):
+        obter_fila().retry_failed()
+
+    if ids:
+        st.dataframe(
+            pd.DataFrame(
+                [
+                    {
+                        "Lançamento": f"#{i}",
+                        "Status": STATUS_LABELS.get(status["ids"].get(i, {}).get("status"), "—"),
+                        "Última falha": status["ids"].get(i, {}).get("error") or "",
+                    }
+                    for i in reversed(ids)
+                ]
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+
+# ==========================================================
+# IMPORTAÇÃO EM LOTE (CSV/XLSX)
+# ==========================================================
+def ler_arquivo_lote(arquivo) -> pd.DataFrame:
+    """Lê o CSV/XLSX enviado com todas as células como texto, como vêm da planilha."""
+    if arquivo.name.lower().endswith(".xlsx"):
+        # pd.read_excel depende do openpyxl
+        return pd.read_excel(arquivo, dtype=str, keep_default_na=False)
+
+    for encoding in ("utf-8-sig", "latin-1"):
+        arquivo.seek(0)
+        try:
+            # sep=None detecta "," ou ";" (CSV exportado por Excel em pt-BR)
+            return pd.read_csv(
+                arquivo,
+                sep=None,
+                engine="python",
+                dtype=str,
+                keep_default_na=False,
+                encoding=encoding,
+            )
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("Não foi possível ler o arquivo como CSV.")
+
+
+def validar_lote(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Normaliza e valida todas as linhas de uma vez, com as mesmas regras do
+    formulário. Devolve (aceitas, rejeitadas): aceitas já nas colunas e na
+    ordem da planilha; rejeitadas com a linha do arquivo e os motivos.
+    """
+    columns = resolve_columns(df.columns)
+    faltando = [key for key, col in columns.items() if col is None and key not in ("descricao", "message_id")]
+    if faltando:
+        raise ValueError("Colunas obrigatórias ausentes no arquivo: " + ", ".join(faltando))
+
+    tipo = normalize_text_series(df[columns["tipo"]], lower=True).replace({"saída": "saida"})
+    cliente = normalize_text_series(df[columns["cliente"]], lower=True)
+    forma_pagamento = normalize_text_series(df[columns["forma_pagamento"]], lower=True)
+    categoria = normalize_text_series(df[columns["categoria"]], lower=True)
+    produto = normalize_text_series(df[columns["produto"]], lower=True)
+    valor = normalize_decimal_series(df[columns["valor"]])
+
+    # quantidade fracionária não vira Int64: só inteiros >= 1 passam pelo normalizador
+    quantidade_num = normalize_decimal_series(df[columns["quantidade"]])
+    quantidade_ok = quantidade_num.notna() & (quantidade_num % 1 == 0) & (quantidade_num >= 1)
+    quantidade = normalize_integer_series(quantidade_num.where(quantidade_ok))
+
+    # datas em ISO (2025-01-31, também as do Excel) ou no padrão BR (31/01/2025)
+    data_txt = df[columns["data"]].astype(str).str.strip()
+    data = pd.to_datetime(data_txt, format="ISO8601", errors="coerce").fillna(
+        pd.to_datetime(data_txt, format="%d/%m/%Y", errors="coerce")
+    )
+
+    if columns["descricao"] is not None:
+        descricao = normalize_text_series(df[columns["descricao"]]).fillna("")
+    else:
+        descricao = pd.Series("", index=df.index)
+
+    motivos = pd.DataFrame(
+        {
+            "Tipo inválido": ~tipo.isin(TIPOS).fillna(False),
+            "Cliente inválido": ~cliente.isin(CLIENTES).fillna(False),
+            "Forma de pagamento inválida": ~forma_pagamento.isin(FORMAS_PAGAMENTO).fillna(False),
+            "Categoria inválida": ~categoria.isin(CATEGORIAS).fillna(False),
+            "Produto inválido": ~produto.isin(PRODUTOS).fillna(False),
+            "Quantidade inválida": ~quantidade_ok.fillna(False),
+            "Valor inválido": ~(valor > 0).fillna(False),
+            "Data inválida": data.isna(),
+        },
+        index=df.index,
+    )
+    rejeitada = motivos.any(axis=1)
+
+    aceitas = pd.DataFrame(
+        {
+            "tipo": tipo,
+            "cliente": cliente,
+            "forma de pagamento": forma_pagamento,
+            "categoria": categoria,
+            "produto": produto,
+            "quantidade": quantidade,
+            "descrição": descricao,
+            "valor": valor,
+            "data": data.dt.strftime("%Y-%m-%d"),
+        }
+    )[~rejeitada]
+
+    texto = np.full(len(df), "", dtype=object)
+    for motivo, mascara in motivos.items():
+        texto = texto + np.where(mascara.to_numpy(), motivo + "; ", "")
+
+    rejeitadas = df[rejeitada].copy()
+    # linha 1 do arquivo é o cabeçalho
+    rejeitadas.insert(0, "Linha", df.index[rejeitada] + 2)
+    rejeitadas.insert(1, "Motivos", pd.Series(texto, index=df.index)[rejeitada].str.rstrip("; "))
+    return aceitas, rejeitadas
+
+
+def enviar_lote(aceitas: pd.DataFrame, inicio: int = 0, progresso=None) -> int:
+    """
+    Grava as linhas aceitas a partir de inicio em blocos de IMPORT_CHUNK_ROWS,
+    uma chamada append_rows por bloco. Devolve quantas linhas já foram
+    gravadas; se um bloco falhar, a exceção sobe e os anteriores ficam.
+    """
+    # listas de tipos nativos do Python (a API recebe JSON)
+    linhas = list(zip(*(aceitas[col].tolist() for col in aceitas.columns)))
+    aba = obter_aba()
+
+    enviadas = inicio
+    for first in range(inicio, len(linhas), IMPORT_CHUNK_ROWS):
+        bloco = [list(linha) for linha in linhas[first:first + IMPORT_CHUNK_ROWS]]
+        aba.append_rows(bloco, value_input_option="USER_ENTERED")
+        enviadas = first + len(bloco)
+        st.session_state["cadastro_lote"]["enviadas"] = enviadas
+        if progresso is not None:
+            progresso.progress(enviadas / len(linhas), text=f"{enviadas} de {len(linhas)} linhas gravadas")
+    return enviadas
+
+
+with st.expander("Importar lançamentos em lote (CSV/XLSX)"):
+    st.caption(
+        "O arquivo deve ter as mesmas colunas da planilha: Tipo, Cliente, Forma de Pagamento, "
+        "Categoria, Produto, Quantidade, Descrição (opcional), Valor e Data."
+    )
+    arquivo = st.file_uploader("Arquivo", type=["csv", "xlsx"], key="cadastro_arquivo_lote")
+
+    if arquivo is not None:
+        try:
+            aceitas, rejeitadas = validar_lote(ler_arquivo_lote(arquivo))
+        except ImportError:
+            st.error("Para importar XLSX, instale o openpyxl (pip install openpyxl) ou envie o arquivo em CSV.")
+            aceitas = None
+        except ValueError as e:
+            st.error(str(e))
+            aceitas = None
+
+        if aceitas is not None:
+            # progresso do envio por arquivo: um novo envio continua de onde parou
+            lote = st.session_state.get("cadastro_lote")
+            if lote is None or lote["arquivo"] != arquivo.file_id:
+                lote = st.session_state["cadastro_lote"] = {"arquivo": arquivo.file_id, "enviadas": 0}
+
+            c1, c2 = st.columns(2)
+            c1.metric("Linhas aceitas", len(aceitas))
+            c2.metric("Linhas rejeitadas", len(rejeitadas))
+
+            if len(rejeitadas):
+                resumo = (
+                    rejeitadas["Motivos"].str.split("; ").explode().value_counts()
+                    .rename_axis("Motivo").reset_index(name="Linhas")
+                )
+                st.dataframe(resumo, use_container_width=True, hide_index=True)
+                st.dataframe(rejeitadas, use_container_width=True, hide_index=True)
+
+            restantes = len(aceitas) - lote["enviadas"]
+            if lote["enviadas"]:
+                st.info(f"{lote['enviadas']} de {len(aceitas)} linhas aceitas já foram gravadas.")
+
+            if restantes > 0 and st.button(f"Gravar {restantes} linhas na planilha"):
+                progresso = st.progress(0.0)
+                try:
+                    enviadas = enviar_lote(aceitas, lote["enviadas"], progresso)
+                    st.success(f"{enviadas} lançamentos importados.")
+                except Exception as e:
+                    st.error(
+                        f"Erro ao gravar o lote: {lote['enviadas']} de {len(aceitas)} linhas foram gravadas. "
+                        "Clique de novo para continuar de onde parou."
+                    )
+                    st.exception(e)
 
 
 # ==========================================================
@@ -168,13 +401,16 @@ if submitted:
     }
 
     try:
-        salvar_lancamento_google_sheets(novo_registro)
-        st.success("Lançamento salvo com sucesso na planilha.")
+        fila_id = salvar_lancamento_google_sheets(novo_registro)
+        st.session_state.setdefault("cadastro_ids_fila", []).append(fila_id)
+        st.success(f"Lançamento #{fila_id} registrado. Ele será enviado à planilha em instantes.")
         st.dataframe(
             pd.DataFrame([novo_registro]),
             use_container_width=True,
             hide_index=True,
         )
     except Exception as e:
-        st.error("Erro ao salvar no Google Sheets.")
-        st.exception(e)
\ No newline at end of file
+        st.error("Erro ao registrar o lançamento.")
+        st.exception(e)
+
+status_envio()
@@ -1,15 +1,23 @@
 import pandas as pd
 import streamlit as st
 
-from components.filters import aplicar_filtros
-from services.data_loader import load_events, format_brl
+from components.filters import aplicar_filtros, periodo_selecionado, selecoes_ativas
+from components.tabela_paginada import tabela_paginada
+from services.data_loader import load_date_bounds, load_event_index, load_events, format_brl
+from services.kpis import load_kpis
 
 
 st.title("Dashboard Operacional")
 st.caption("Visão operacional e consulta dos registros")
 
+limites_data = load_date_bounds()
+inicio, fim = periodo_selecionado("dashboard")
+if inicio is None and limites_data:
+    # primeira execução: o período padrão do filtro é a base inteira
+    inicio, fim = limites_data
+
 try:
-    df, cols = load_events()
+    df, cols, signature = load_events(inicio=inicio, fim=fim)
 except FileNotFoundError as e:
     st.warning(str(e))
     st.stop()
@@ -35,56 +43,53 @@ work_df = aplicar_filtros(
     categoria_col=categoria_col,
     produto_col=produto_col,
     state_prefix="dashboard",
+    limites_data=limites_data,
+    indice=load_event_index(inicio=inicio, fim=fim, signature=signature),
 )
 
 if work_df.empty:
     st.info("Nenhum registro encontrado com os filtros aplicados.")
     st.stop()
 
-df_entrada = work_df[work_df[tipo_col] == "entrada"]
-df_saida = work_df[work_df[tipo_col].isin(["saída", "saida"])]
-
-total_entrada = df_entrada[valor_col].sum()
-total_saida = df_saida[valor_col].sum()
-saldo = total_entrada - total_saida
+selecoes = selecoes_ativas(
+    "dashboard",
+    tipo_col,
+    cliente_col,
+    forma_pagamento_col,
+    categoria_col,
+    produto_col,
+)
+kpis = load_kpis(work_df, signature, tipo_col, valor_col, inicio, fim, selecoes)
 
 c1, c2, c3, c4 = st.columns(4)
-c1.metric("Entradas", format_brl(total_entrada))
-c2.metric("Saídas", format_brl(total_saida))
-c3.metric("Saldo", format_brl(saldo))
-c4.metric("Registros", f"{len(work_df)}")
+c1.metric("Entradas", format_brl(kpis["entradas"]))
+c2.metric("Saídas", format_brl(kpis["saidas"]))
+c3.metric("Saldo", format_brl(kpis["saldo"]))
+c4.metric("Registros", f"{kpis['registros']}")
 
 st.divider()
 st.subheader("Registros filtrados")
 
-preview_df = work_df.copy()
-
-if data_col:
-    preview_df = preview_df.sort_values(by=data_col, ascending=False)
-
-evento = st.dataframe(
-    preview_df,
-    use_container_width=True,
-    hide_index=True,
-    selection_mode="single-row",
-    on_select="rerun",
+# Só a página visível é ordenada e enviada ao navegador; a linha selecionada
+# volta com o id global (posição do registro na base da versão servida, o
+# mesmo em qualquer período) e continua selecionada ao trocar período ou página
+colunas_ordenacao = [c for c in [data_col, valor_col] if c]
+row = tabela_paginada(
+    work_df,
+    colunas_ordenacao,
+    data_col=data_col,
+    state_prefix="dashboard",
 )
 
-selected_rows = []
-try:
-    selected_rows = evento.selection.get("rows", [])
-except Exception:
-    selected_rows = []
-
 def val_or_blank(row_obj, col_name):
     if not col_name or col_name not in row_obj.index:
         return ""
     value = row_obj[col_name]
     return "" if pd.isna(value) else str(value)
 
-if len(selected_rows) == 1:
+if row is not None:
     st.subheader("Detalhes do registro")
-    row = preview_df.iloc[int(selected_rows[0])]
+    st.caption(f"Registro #{row.name}")
 
     d1, d2 = st.columns(2)
     with d1:
@@ -1,8 +1,29 @@
+from datetime import date
 from pathlib import Path
+import functools
+import hashlib
+import os
+import threading
+import time
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
 import streamlit as st
 
+from services.event_schema import (
+    CATEGORICAL_KEYS,
+    SCHEMA_VERSION,
+    resolve_columns,
+    schema_version,
+)
+from services.event_index import construir_indice, faixa_periodo, recortar_indice
+from services.rollup import agregar_entrada_saida, construir_cubo, filtrar_cubo
+from services.snapshot import dataset_sources, read_snapshot, write_snapshot
+
+# int64 com nulos vira Int64 (e não float64) na conversão para pandas
+_TYPES_MAPPER = {pa.int64(): pd.Int64Dtype()}
+
 
 def find_base_dir() -> Path:
     current = Path(__file__).resolve().parent
@@ -15,6 +36,75 @@ def find_base_dir() -> Path:
     return Path(__file__).resolve().parent
 
 
+def find_events_path() -> Path | None:
+    """
+    Dataset particionado por ano/mês (data/events/) gerado pelo exportador;
+    cai para o arquivo único legado (data/events.parquet) se ainda não existir.
+    """
+    data_dir = find_base_dir() / "data"
+    dataset_dir = data_dir / "events"
+
+    if dataset_dir.is_dir() and any(dataset_dir.rglob("*.parquet")):
+        return dataset_dir
+
+    legacy_file = data_dir / "events.parquet"
+    if legacy_file.exists():
+        return legacy_file
+
+    return None
+
+
+def _open_dataset(parquet_path: Path, files: list[Path] | None = None) -> ds.Dataset:
+    """Dataset de parquet_path; com files, só esses arquivos (os da assinatura)."""
+    if parquet_path.is_dir():
+        if files is None:
+            return ds.dataset(parquet_path, format="parquet", partitioning="hive")
+        return ds.dataset(
+            [str(f) for f in files],
+            format="parquet",
+            partitioning="hive",
+            partition_base_dir=str(parquet_path),
+        )
+    return ds.dataset(parquet_path, format="parquet")
+
+
+def load_date_bounds() -> tuple[date, date] | None:
+    """
+    Menor e maior data da base, lidas só das estatísticas dos rodapés Parquet.
+    Usado como padrão do filtro de período sem precisar carregar os dados.
+    """
+    return _load_date_bounds(served_signature())
+
+
+@st.cache_data(show_spinner=False)
+def _load_date_bounds(signature: tuple) -> tuple[date, date] | None:
+    if not signature:
+        return None
+
+    dataset = _open_dataset(*_signature_files(signature))
+    data_col = resolve_columns(dataset.schema.names)["data"]
+    if not data_col:
+        return None
+
+    minimos, maximos = [], []
+    for fragment in dataset.get_fragments():
+        metadata = fragment.metadata
+        col_idx = metadata.schema.to_arrow_schema().get_field_index(data_col)
+        if col_idx < 0:
+            continue
+        for rg in range(metadata.num_row_groups):
+            stats = metadata.row_group(rg).column(col_idx).statistics
+            if stats is None or not stats.has_min_max:
+                continue
+            minimos.append(pd.Timestamp(stats.min))
+            maximos.append(pd.Timestamp(stats.max))
+
+    if not minimos:
+        return None
+
+    return min(minimos).date(), max(maximos).date()
+
+
 def format_brl(valor: float) -> str:
     return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
@@ -32,37 +122,355 @@ def _normalize_text_series(series: pd.Series, lower: bool = False) -> pd.Series:
     return out
 
 
-@st.cache_data(show_spinner=False)
-def load_events() -> tuple[pd.DataFrame, dict]:
-    base_dir = find_base_dir()
-    parquet_file = base_dir / "data" / "events.parquet"
+@functools.lru_cache(maxsize=4096)
+def _footer_hash(path: str, size: int, mtime_ns: int) -> str:
+    """
+    Hash do rodapé Parquet (metadados + estatísticas) do arquivo. size e mtime
+    entram só como chave do lru_cache: o rodapé é relido apenas quando mudam.
+    """
+    with open(path, "rb") as f:
+        f.seek(-8, os.SEEK_END)
+        tail = f.read(8)
+        if tail[4:] != b"PAR1":
+            raise OSError("Arquivo Parquet incompleto: " + path)
+        footer_len = int.from_bytes(tail[:4], "little")
+        f.seek(-(8 + footer_len), os.SEEK_END)
+        footer = f.read(footer_len)
+    return hashlib.blake2b(footer + tail, digest_size=8).hexdigest()
+
+
+def dataset_signature() -> tuple | None:
+    """
+    (caminho da base, ((arquivo, tamanho, mtime, hash do rodapé), ...)) com
+    cada Parquet da base no disco, ou () sem base. Entra na chave dos caches,
+    então uma exportação nova invalida tudo que foi calculado sobre a anterior,
+    e os loaders leem exatamente os arquivos listados nela.
+
+    None se um arquivo sumiu ou está pela metade durante a leitura (exportação
+    em andamento): a base no disco ainda não tem uma versão estável.
+    """
+    parquet_path = find_events_path()
+    if parquet_path is None:
+        return ()
+
+    try:
+        files = sorted(parquet_path.rglob("*.parquet")) if parquet_path.is_dir() else [parquet_path]
+        entries = []
+        for f in files:
+            stat = f.stat()
+            entries.append((
+                f.relative_to(parquet_path.parent).as_posix(),
+                stat.st_size,
+                stat.st_mtime_ns,
+                _footer_hash(str(f), stat.st_size, stat.st_mtime_ns),
+            ))
+    except OSError as e:
+        print("Base de eventos mudando no disco, mantendo a versão atual:", repr(e))
+        return None
+    return (str(parquet_path), tuple(entries))
+
+
+def _signature_files(signature: tuple) -> tuple[Path, list[Path]]:
+    """Caminho da base e arquivos Parquet da versão descrita pela assinatura."""
+    parquet_path, entries = signature
+    parquet_path = Path(parquet_path)
+    return parquet_path, [parquet_path.parent / rel for rel, _, _, _ in entries]
+
+
+def _replaced(served: tuple, on_disk: tuple) -> bool:
+    # base que não existia, ou algum arquivo da versão servida foi apagado ou
+    # regravado (reconstrução completa): não há versão anterior para servir
+    if not served or not on_disk or served[0] != on_disk[0]:
+        return True
+    return not set(served[1]) <= set(on_disk[1])
+
+
+@st.cache_resource
+def _snapshot_state() -> dict:
+    # assinatura servida a todas as sessões e a que está sendo carregada em segundo plano
+    return {"lock": threading.Lock(), "signature": None, "loading": None}
+
+
+def served_signature() -> tuple:
+    """
+    Assinatura da base que as páginas devem usar. Quando os arquivos mudam, a
+    versão nova é carregada numa thread enquanto a anterior continua sendo
+    servida, e a troca acontece de uma vez quando os caches da nova estão
+    prontos. Só o primeiro carregamento do processo espera a leitura.
+    """
+    state = _snapshot_state()
+    on_disk = dataset_signature()
+    tentativas = 1
+    while on_disk is None and state["signature"] is None and tentativas < 10:
+        # primeiro carregamento durante uma exportação: espera os arquivos fecharem
+        time.sleep(0.5)
+        on_disk = dataset_signature()
+        tentativas += 1
+
+    with state["lock"]:
+        if on_disk is None:
+            # ainda sem versão estável: as páginas avisam que não há base
+            return state["signature"] if state["signature"] is not None else ()
+        if state["signature"] is None or _replaced(state["signature"], on_disk):
+            # sem versão anterior legível, a nova é carregada na hora
+            state["signature"] = on_disk
+            state["loading"] = None
+        elif on_disk != state["signature"] and state["loading"] != on_disk:
+            state["loading"] = on_disk
+            threading.Thread(
+                target=_warm_snapshot,
+                args=(state, on_disk),
+                name="events-snapshot-reload",
+                daemon=True,
+            ).start()
+        return state["signature"]
+
+
+def _warm_snapshot(state: dict, signature: tuple):
+    try:
+        _load_events(signature, None)
+        _load_event_index(signature, None)
+        _load_rollup(signature)
+    except Exception as e:
+        print("Falha ao recarregar a base em segundo plano:", repr(e))
+        with state["lock"]:
+            if state["loading"] == signature:
+                state["loading"] = None
+        return
+
+    with state["lock"]:
+        if state["loading"] == signature:
+            state["signature"] = signature
+            state["loading"] = None
+
 
-    if not parquet_file.exists():
+def filter_signature(inicio: date | None, fim: date | None, selecoes: dict) -> tuple:
+    """Chave hashable e independente de ordem para o período + seleções dos filtros."""
+    return (inicio, fim, tuple(sorted((col, tuple(sorted(v))) for col, v in selecoes.items() if v)))
+
+
+def load_events(
+    inicio: date | None = None,
+    fim: date | None = None,
+    columns: list[str] | None = None,
+) -> tuple[pd.DataFrame, dict, tuple]:
+    """
+    Carrega os eventos, ordenados por data (datas nulas no fim). Com inicio/fim
+    só as linhas do intervalo; columns (nomes lógicos: "tipo", "valor",
+    "data"...) limita as colunas. Devolve também a assinatura da versão lida:
+    passe-a a load_event_index, load_period_series e load_kpis para que tudo
+    na página venha da mesma versão, mesmo que a troca em segundo plano
+    aconteça no meio da execução.
+
+    A base inteira é carregada uma vez por versão e compartilhada entre as
+    sessões; o período é uma fatia de posições dela (sem cópia). No pandas 3 o
+    copy-on-write vale sempre: qualquer escrita no DataFrame devolvido
+    (df[col] = ..., df.loc[...] = ...) copia só o que altera e nunca chega à
+    base compartilhada.
+    """
+    columns = tuple(sorted(columns)) if columns else None
+    signature = served_signature()
+    df, columns_map = _load_events(signature, columns)
+    lo, hi = _period_range(signature, inicio, fim, columns)
+    return df.iloc[lo:hi], dict(columns_map), signature
+
+
+def load_event_index(
+    inicio: date | None = None,
+    fim: date | None = None,
+    columns: list[str] | None = None,
+    signature: tuple | None = None,
+) -> dict:
+    """
+    Índice invertido (services.event_index) do mesmo DataFrame de load_events:
+    recorte do índice da base inteira, com posições relativas ao período.
+    Compartilhado entre sessões e somente leitura.
+    """
+    columns = tuple(sorted(columns)) if columns else None
+    if signature is None:
+        signature = served_signature()
+    lo, hi = _period_range(signature, inicio, fim, columns)
+    return recortar_indice(_load_event_index(signature, columns), lo, hi)
+
+
+def load_rollup(
+    inicio: date | None = None,
+    fim: date | None = None,
+) -> pd.DataFrame:
+    """Cubo diário (services.rollup) do mesmo recorte de load_events."""
+    signature = served_signature()
+    _, columns_map = _load_events(signature, None)
+    return filtrar_cubo(_load_rollup(signature), columns_map["data"], inicio, fim, {})
+
+
+def load_period_series(
+    inicio: date | None,
+    fim: date | None,
+    selecoes: dict,
+    granularidade: str,
+    signature: tuple | None = None,
+) -> pd.DataFrame:
+    """
+    Série entrada/saida/lucro por período (services.rollup.agregar_entrada_saida)
+    do cubo filtrado. Memoizada por (assinatura do filtro, granularidade): trocar
+    o rádio ou desenhar o segundo gráfico com a mesma granularidade é só consulta.
+    """
+    filtro = filter_signature(inicio, fim, selecoes)
+    if signature is None:
+        signature = served_signature()
+    return _load_period_series(signature, filtro, granularidade)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _load_period_series(signature: tuple, filtro: tuple, granularidade: str) -> pd.DataFrame:
+    inicio, fim, selecoes = filtro
+    _, columns_map = _load_events(signature, None)
+    cubo = filtrar_cubo(_load_rollup(signature), columns_map["data"], inicio, fim, dict(selecoes))
+    return agregar_entrada_saida(
+        cubo,
+        columns_map["data"],
+        columns_map["valor"],
+        columns_map["tipo"],
+        granularidade,
+    )
+
+
+def _period_range(
+    signature: tuple,
+    inicio: date | None,
+    fim: date | None,
+    columns: tuple[str, ...] | None,
+) -> tuple[int, int]:
+    # posições [lo, hi) do período na base da assinatura (a base inteira sem período)
+    indice = _load_event_index(signature, columns)
+    if inicio is None or fim is None or not _load_events(signature, columns)[1]["data"]:
+        return 0, indice["n_linhas"]
+    return faixa_periodo(indice, inicio, fim)
+
+
+# Caches por versão da base, nunca por período: a versão servida e a que está
+# sendo carregada em segundo plano (served_signature)
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _load_rollup(signature: tuple) -> pd.DataFrame:
+    df, columns_map = _load_events(signature, None)
+    return construir_cubo(df, columns_map)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _load_event_index(signature: tuple, columns: tuple[str, ...] | None) -> dict:
+    df, columns_map = _load_events(signature, columns)
+    dimensoes = [columns_map[k] for k in CATEGORICAL_KEYS if columns_map.get(k)]
+    indice = construir_indice(df, columns_map.get("data"), dimensoes)
+
+    # compartilhado entre sessões: nenhum array do índice pode ser alterado
+    indice["datas"].flags.writeable = False
+    for dimensao in indice["dimensoes"].values():
+        dimensao["codigos"].flags.writeable = False
+        for posicoes in dimensao["posicoes"]:
+            posicoes.flags.writeable = False
+
+    return indice
+
+
+_snapshot_lock = threading.Lock()
+
+
+def _snapshot_for(dataset_dir: Path, files: list[Path], sources: list[list]):
+    """
+    Snapshot da versão de files, gravado na hora se ainda não existir (a
+    primeira carga de cada versão paga a leitura do Parquet uma vez; as
+    seguintes, em qualquer processo, só mapeiam o arquivo). None se não for
+    possível gravar ou se files já não for a versão no disco (uma versão
+    antiga ainda servida não sobrescreve o snapshot da nova).
+    """
+    snapshot = read_snapshot(dataset_dir, sources)
+    if snapshot is not None:
+        return snapshot
+    with _snapshot_lock:
+        snapshot = read_snapshot(dataset_dir, sources)
+        if snapshot is None:
+            try:
+                if dataset_sources(dataset_dir) != sources:
+                    return None
+                write_snapshot(dataset_dir, files)
+            except OSError as e:
+                print("Não foi possível gravar o snapshot Arrow, lendo o Parquet:", repr(e))
+                return None
+            snapshot = read_snapshot(dataset_dir, sources)
+    return snapshot
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _load_events(signature: tuple, columns: tuple[str, ...] | None) -> tuple[pd.DataFrame, dict]:
+    """
+    Base carregada uma única vez por processo (st.cache_resource), sem a cópia
+    via pickle que st.cache_data faz para cada chamada. É compartilhada por
+    todas as sessões: só deve ser lida, e load_events entrega views.
+    """
+    if not signature:
         raise FileNotFoundError(
-            "Ainda não existe data/events.parquet. Rode export_to_parquet.py antes."
+            "Ainda não existe data/events/. Rode export_to_parquet.py antes."
         )
 
-    df = pd.read_parquet(parquet_file).copy()
-    col_map = {c.lower().strip(): c for c in df.columns}
+    # só os arquivos da assinatura: uma falta de cache com uma chave antiga
+    # nunca lê a versão nova da base, que já pode estar no disco
+    parquet_path, files = _signature_files(signature)
+    sources = [[rel, size] for rel, size, _, _ in signature[1]]
 
-    tipo_col = col_map.get("tipo")
-    cliente_col = col_map.get("cliente")
-    forma_pagamento_col = (
-        col_map.get("forma de pagamento")
-        or col_map.get("forma_pagamento")
-    )
-    categoria_col = col_map.get("categoria")
-    produto_col = col_map.get("produto")
-    quantidade_col = col_map.get("quantidade")
-    descricao_col = col_map.get("descrição") or col_map.get("descricao")
-    valor_col = col_map.get("valor")
-    data_col = col_map.get("data")
-
-    if not tipo_col or not valor_col:
+    # snapshot Arrow (services.snapshot) mapeado em memória, se for da mesma versão
+    snapshot = _snapshot_for(parquet_path, files, sources) if parquet_path.is_dir() else None
+    source = snapshot if snapshot is not None else _open_dataset(parquet_path, files)
+    dataset_cols = [c for c in source.schema.names if c not in ("ano", "mes")]
+    columns_map = resolve_columns(dataset_cols)
+
+    if not columns_map["tipo"] or not columns_map["valor"]:
         raise ValueError(
-            f"Não encontrei as colunas mínimas esperadas. Colunas disponíveis: {list(df.columns)}"
+            f"Não encontrei as colunas mínimas esperadas. Colunas disponíveis: {dataset_cols}"
         )
 
+    read_cols = dataset_cols
+    if columns:
+        wanted = {"tipo", "valor", "data", *columns}
+        read_cols = [c for c in dataset_cols if c in {columns_map.get(k) for k in wanted}]
+        columns_map = {k: (v if v in read_cols else None) for k, v in columns_map.items()}
+
+    if snapshot is not None:
+        # já ordenado por data e com dicionários unificados: to_pandas ainda
+        # copia as colunas de texto e converte as datas, mas sem ler nem
+        # descomprimir o Parquet
+        table = snapshot.select(read_cols)
+        return table.to_pandas(types_mapper=_TYPES_MAPPER.get, split_blocks=True), columns_map
+
+    dataset = source
+    table = dataset.to_table(columns=read_cols)
+
+    if schema_version(dataset.schema) == SCHEMA_VERSION:
+        # Gravado pelo exportador no schema estrito: só mapeia as colunas
+        # cada arquivo tem o próprio dicionário (exportações novas podem trazer
+        # categorias novas); unificar deixa um único conjunto de códigos
+        df = table.unify_dictionaries().to_pandas(types_mapper=_TYPES_MAPPER.get)
+    else:
+        df = _normalize_legacy(table.to_pandas(), columns_map)
+
+    # ordem por data: posições do índice invertido e filtro de período por searchsorted
+    if columns_map["data"]:
+        df = df.sort_values(columns_map["data"], kind="stable", na_position="last", ignore_index=True)
+
+    return df, columns_map
+
+
+def _normalize_legacy(df: pd.DataFrame, columns: dict) -> pd.DataFrame:
+    """Normalização para arquivos sem versão de schema (data/events.parquet antigo)."""
+    tipo_col = columns["tipo"]
+    cliente_col = columns["cliente"]
+    forma_pagamento_col = columns["forma_pagamento"]
+    categoria_col = columns["categoria"]
+    produto_col = columns["produto"]
+    quantidade_col = columns["quantidade"]
+    descricao_col = columns["descricao"]
+    valor_col = columns["valor"]
+    data_col = columns["data"]
+
     # ==========================================================
     # Tratamentos numéricos
     # ==========================================================
@@ -103,16 +511,8 @@ def load_events() -> tuple[pd.DataFrame, dict]:
     if descricao_col:
         df[descricao_col] = _normalize_text_series(df[descricao_col], lower=False)
 
-    columns = {
-        "tipo": tipo_col,
-        "cliente": cliente_col,
-        "forma_pagamento": forma_pagamento_col,
-        "categoria": categoria_col,
-        "produto": produto_col,
-        "quantidade": quantidade_col,
-        "descricao": descricao_col,
-        "valor": valor_col,
-        "data": data_col,
-    }
-
-    return df, columns
\ No newline at end of file
+    for key in CATEGORICAL_KEYS:
+        if columns[key]:
+            df[columns[key]] = df[columns[key]].astype("category")
+
+    return df
@@ -0,0 +1,148 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Índice invertido sobre o DataFrame carregado (ordenado por data):
+#
+#   {
+#       "n_linhas": int,
+#       "datas": datetime64[us] ordenado, só as linhas com data,
+#       "dimensoes": {
+#           coluna: {
+#               "categorias": [valor, ...],
+#               "codigos": int32 por linha (-1 = nulo),
+#               "posicoes": [posições ordenadas das linhas de cada categoria],
+#           },
+#       },
+#   }
+#
+# Conjuntos de linhas são arrays ordenados de posições (np.int64), ou None
+# quando a dimensão não restringe nada.
+#
+# recortar_indice devolve o índice de uma fatia [lo, hi) sem copiar nada:
+# "datas" e "codigos" viram views, as listas de posições continuam as da base
+# e "base" (= lo) leva as posições delas para a fatia.
+
+
+def mascara_isin(serie: pd.Series, valores) -> np.ndarray:
+    """
+    Equivalente a serie.astype(str).isin(valores). Para colunas category compara
+    só os códigos inteiros, sem materializar strings por linha.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos = serie.cat.categories.get_indexer(list(valores))
+        return np.isin(serie.cat.codes.to_numpy(), codigos[codigos >= 0])
+    return serie.astype(str).isin(valores).to_numpy()
+
+
+def construir_indice(df: pd.DataFrame, data_col: str | None, dimensoes: list[str]) -> dict:
+    """Monta o índice. df precisa estar ordenado por data_col com as datas nulas no fim."""
+    datas = np.array([], dtype="datetime64[us]")
+    if data_col:
+        datas = df[data_col].to_numpy(dtype="datetime64[us]")
+        datas = datas[~np.isnat(datas)]
+
+    indice = {"n_linhas": len(df), "base": 0, "datas": datas, "dimensoes": {}}
+
+    for col in dimensoes:
+        serie = df[col]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos = serie.cat.codes.to_numpy().astype(np.int32)
+            categorias = serie.cat.categories.astype(str).tolist()
+        else:
+            codigos, uniques = pd.factorize(serie.astype("string"))
+            codigos = codigos.astype(np.int32)
+            categorias = [str(v) for v in uniques]
+
+        # argsort estável mantém as posições de cada categoria em ordem crescente
+        ordem = np.argsort(codigos, kind="stable")
+        contagens = np.bincount(codigos + 1, minlength=len(categorias) + 1)
+        limites = np.cumsum(contagens)
+        posicoes = np.split(ordem.astype(np.int64), limites[:-1])[1:]
+
+        indice["dimensoes"][col] = {
+            "categorias": categorias,
+            "codigos": codigos,
+            "posicoes": posicoes,
+        }
+
+    return indice
+
+
+def faixa_periodo(indice: dict, inicio: date, fim: date) -> tuple[int, int]:
+    """Intervalo [lo, hi) de posições com data entre inicio e fim (dias inteiros)."""
+    datas = indice["datas"]
+    inicio_ts = np.datetime64(inicio, "us")
+    fim_ts = np.datetime64(fim, "us") + np.timedelta64(1, "D")
+    return int(np.searchsorted(datas, inicio_ts, "left")), int(np.searchsorted(datas, fim_ts, "left"))
+
+
+def recortar_indice(indice: dict, lo: int, hi: int) -> dict:
+    """Índice das linhas [lo, hi) de indice, com posições relativas a lo."""
+    datas = indice["datas"]
+    return {
+        "n_linhas": hi - lo,
+        "base": indice["base"] + lo,
+        "datas": datas[min(lo, len(datas)):min(hi, len(datas))],
+        "dimensoes": {
+            col: {
+                "categorias": dimensao["categorias"],
+                "codigos": dimensao["codigos"][lo:hi],
+                "posicoes": dimensao["posicoes"],
+            }
+            for col, dimensao in indice["dimensoes"].items()
+        },
+    }
+
+
+def posicoes_selecao(indice: dict, col: str, valores) -> np.ndarray:
+    """União das listas de posições dos valores escolhidos (já disjuntas entre si)."""
+    dimensao = indice["dimensoes"][col]
+    lookup = {v: i for i, v in enumerate(dimensao["categorias"])}
+    base, fim = indice["base"], indice["base"] + indice["n_linhas"]
+    listas = []
+    for v in valores:
+        if v in lookup:
+            posicoes = dimensao["posicoes"][lookup[v]]
+            listas.append(posicoes[np.searchsorted(posicoes, base):np.searchsorted(posicoes, fim)])
+    if not listas:
+        return np.array([], dtype=np.int64)
+    return np.sort(np.concatenate(listas)) - base
+
+
+def intersectar(conjuntos, faixa: tuple[int, int]) -> np.ndarray | None:
+    """
+    Interseção dos conjuntos de posições dentro da faixa de datas.
+    Devolve None quando nenhum conjunto restringe (= a faixa inteira).
+    """
+    lo, hi = faixa
+    ativos = [c for c in conjuntos if c is not None]
+    if not ativos:
+        return None
+
+    ativos.sort(key=len)
+    out = ativos[0][np.searchsorted(ativos[0], lo):np.searchsorted(ativos[0], hi)]
+    for conjunto in ativos[1:]:
+        if len(out) == 0:
+            break
+        out = np.intersect1d(out, conjunto, assume_unique=True)
+    return out
+
+
+def valores_presentes(indice: dict, col: str, linhas: np.ndarray | None, faixa: tuple[int, int]) -> list[str]:
+    """Categorias de col que aparecem nas linhas (ou na faixa inteira se linhas for None)."""
+    dimensao = indice["dimensoes"][col]
+    lo, hi = faixa
+
+    if linhas is None:
+        presentes = [
+            cat
+            for cat, pos in zip(dimensao["categorias"], dimensao["posicoes"])
+            if np.searchsorted(pos, indice["base"] + lo) < np.searchsorted(pos, indice["base"] + hi)
+        ]
+        return sorted(presentes)
+
+    codigos = dimensao["codigos"][linhas]
+    contagem = np.bincount(codigos + 1, minlength=len(dimensao["categorias"]) + 1)[1:]
+    return sorted(cat for cat, n in zip(dimensao["categorias"], contagem) if n > 0)
@@ -0,0 +1,82 @@
+import pandas as pd
+import pyarrow as pa
+
+# Incrementar sempre que o formato gravado pelo exportador mudar
+# (tipos, colunas derivadas, regras de normalização).
+SCHEMA_VERSION = "2"
+SCHEMA_VERSION_KEY = b"events_schema_version"
+
+EXPORTED_AT_COL = "Data/Hora da Exportação"
+
+# Coluna oculta da planilha com o id da mensagem do Telegram de cada linha
+# (vazia nas linhas do cadastro); o exportador descarta ids repetidos
+MESSAGE_ID_COL = "ID Mensagem"
+
+# Colunas de baixa cardinalidade gravadas como colunas de dicionário
+CATEGORICAL_KEYS = ["tipo", "cliente", "forma_pagamento", "categoria", "produto"]
+
+_ALIASES = {
+    "tipo": ("tipo",),
+    "cliente": ("cliente",),
+    "forma_pagamento": ("forma de pagamento", "forma_pagamento"),
+    "categoria": ("categoria",),
+    "produto": ("produto",),
+    "quantidade": ("quantidade",),
+    "descricao": ("descrição", "descricao"),
+    "valor": ("valor",),
+    "data": ("data",),
+    "message_id": ("id mensagem", "id_mensagem", "message_id"),
+}
+
+_ARROW_TYPES = {
+    "quantidade": pa.int64(),
+    "descricao": pa.large_string(),
+    "valor": pa.float64(),
+    "data": pa.timestamp("us"),
+    "message_id": pa.int64(),
+}
+
+
+def resolve_columns(names) -> dict:
+    """
+    Mapeia os nomes lógicos ("tipo", "forma_pagamento"...) para os nomes reais
+    das colunas, tolerando maiúsculas/minúsculas e as variações com/sem acento.
+    """
+    col_map = {str(c).lower().strip(): c for c in names}
+    columns = {}
+    for key, aliases in _ALIASES.items():
+        columns[key] = next((col_map[a] for a in aliases if a in col_map), None)
+    return columns
+
+
+def arrow_type_for(key: str | None) -> pa.DataType:
+    if key in CATEGORICAL_KEYS:
+        return pa.dictionary(pa.int32(), pa.large_string())
+    return _ARROW_TYPES.get(key, pa.large_string())
+
+
+def build_schema(names) -> pa.Schema:
+    """Schema estrito do dataset para as colunas da planilha, com a versão carimbada."""
+    columns = resolve_columns(names)
+    key_by_col = {col: key for key, col in columns.items() if col is not None}
+
+    fields = [
+        pa.field(name, arrow_type_for(key_by_col.get(name)))
+        for name in names
+        if name != EXPORTED_AT_COL
+    ]
+    fields.append(pa.field(EXPORTED_AT_COL, pa.timestamp("us", tz="America/Sao_Paulo")))
+
+    return pa.schema(fields, metadata={SCHEMA_VERSION_KEY: SCHEMA_VERSION.encode()})
+
+
+def schema_version(schema: pa.Schema) -> str | None:
+    metadata = schema.metadata or {}
+    value = metadata.get(SCHEMA_VERSION_KEY)
+    return value.decode() if value is not None else None
+
+
+def to_typed_table(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """Converte o DataFrame já normalizado para uma tabela Arrow no schema estrito."""
+    arrays = [pa.array(df[field.name], type=field.type, from_pandas=True) for field in schema]
+    return pa.Table.from_arrays(arrays, schema=schema)
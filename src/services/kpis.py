@@ -0,0 +1,65 @@
+from datetime import date
+
+import pandas as pd
+import streamlit as st
+
+from services.data_loader import filter_signature
+
+
+def calcular_kpis(df: pd.DataFrame, tipo_col: str, valor_col: str) -> dict:
+    """
+    Indicadores do recorte numa única redução agrupada por tipo:
+    entradas, saídas, saldo, registros, ticket médio das entradas e o total
+    e a contagem de cada tipo ("saída" e "saida" contam como "saida").
+    """
+    tipo = df[tipo_col].astype("string")
+    tipo = tipo.mask(tipo.isin(["saída", "saida"]), "saida")
+
+    agg = df[valor_col].groupby(tipo, dropna=False).agg(["sum", "size"])
+    por_tipo = {
+        ("" if pd.isna(t) else str(t)): {"total": float(row["sum"]), "registros": int(row["size"])}
+        for t, row in agg.iterrows()
+    }
+
+    entrada = por_tipo.get("entrada", {"total": 0.0, "registros": 0})
+    saida = por_tipo.get("saida", {"total": 0.0, "registros": 0})
+
+    return {
+        "entradas": entrada["total"],
+        "saidas": saida["total"],
+        "saldo": entrada["total"] - saida["total"],
+        "registros": len(df),
+        "ticket_medio": entrada["total"] / entrada["registros"] if entrada["registros"] else 0.0,
+        "por_tipo": por_tipo,
+    }
+
+
+def load_kpis(
+    work_df: pd.DataFrame,
+    signature: tuple,
+    tipo_col: str,
+    valor_col: str,
+    inicio: date | None,
+    fim: date | None,
+    selecoes: dict,
+) -> dict:
+    """
+    calcular_kpis memoizado pela versão da base e pelo estado dos filtros:
+    páginas diferentes com o mesmo período e as mesmas seleções reaproveitam o
+    resultado, e uma recarga da base invalida tudo. signature é a que
+    load_events devolveu junto com a base de work_df: work_df fica fora da
+    chave, então ela não pode ser lida de novo aqui.
+    """
+    filtro = filter_signature(inicio, fim, selecoes)
+    return _load_kpis(signature, filtro, tipo_col, valor_col, work_df)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _load_kpis(
+    signature: tuple,
+    filtro: tuple,
+    tipo_col: str,
+    valor_col: str,
+    _work_df: pd.DataFrame,
+) -> dict:
+    return calcular_kpis(_work_df, tipo_col, valor_col)
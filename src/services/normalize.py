@@ -0,0 +1,43 @@
+import pandas as pd
+
+# Normalizações das colunas da planilha, compartilhadas pelo exportador
+# (export_to_parquet) e pela importação em lote do cadastro.
+
+
+def normalize_text_series(series: pd.Series, lower: bool = False) -> pd.Series:
+    out = series.astype(str).str.strip()
+    out = out.replace({"": pd.NA, "nan": pd.NA, "None": pd.NA})
+    if lower:
+        out = out.str.lower()
+    return out
+
+
+def normalize_decimal_series(series: pd.Series) -> pd.Series:
+    """
+    Trata valores como:
+    1234,56
+    1.234,56
+    1234.56
+    """
+    s = series.astype(str).str.strip()
+    s = s.replace({"": pd.NA, "nan": pd.NA, "None": pd.NA})
+
+    # se tiver vírgula, assume padrão BR e remove pontos de milhar
+    has_comma = s.str.contains(",", na=False)
+
+    s_br = (
+        s.where(has_comma)
+        .astype("string")
+        .str.replace(".", "", regex=False)
+        .str.replace(",", ".", regex=False)
+    )
+
+    s_en = s.where(~has_comma).astype("string")
+
+    s_final = s_en.fillna(s_br)
+    return pd.to_numeric(s_final, errors="coerce")
+
+
+def normalize_integer_series(series: pd.Series) -> pd.Series:
+    s = pd.to_numeric(series, errors="coerce")
+    return s.astype("Int64")
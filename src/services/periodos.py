@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+GRANULARIDADES = ["Semana", "Mês", "Trimestre", "Ano"]
+
+_FREQ = {
+    "Semana": "W",
+    "Mês": "M",
+    "Trimestre": "Q",
+    "Ano": "Y",
+}
+
+
+def inicio_periodo(serie: pd.Series, granularidade: str) -> pd.Series:
+    """Início do período (segunda-feira da semana, 1º dia do mês...) de cada data."""
+    freq = _FREQ.get(granularidade, "Y")
+    return serie.dt.to_period(freq).dt.start_time
+
+
+def criar_labels(base_df: pd.DataFrame, granularidade: str) -> pd.DataFrame:
+    periodo = base_df["periodo"].dt
+
+    if granularidade == "Semana":
+        label = periodo.strftime("%d/%m/%Y")
+    elif granularidade == "Mês":
+        label = periodo.strftime("%m/%Y")
+    elif granularidade == "Trimestre":
+        label = "T" + periodo.quarter.astype(str) + "/" + periodo.year.astype(str)
+    else:
+        label = periodo.strftime("%Y")
+
+    return base_df.assign(label=label)
+
+
+def calcular_lucro(base_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Acrescenta lucro, perc_lucro (0 quando não há entrada no período) e a cor
+    da barra, tudo com operações vetorizadas sobre as colunas entrada/saida.
+    """
+    entrada = base_df["entrada"].to_numpy(dtype="float64")
+    lucro = entrada - base_df["saida"].to_numpy(dtype="float64")
+
+    perc_lucro = np.zeros_like(lucro)
+    np.divide(lucro, entrada, out=perc_lucro, where=entrada != 0)
+    perc_lucro *= 100
+
+    return base_df.assign(
+        lucro=lucro,
+        perc_lucro=perc_lucro,
+        cor=np.where(perc_lucro >= 0, "green", "red"),
+    )
@@ -0,0 +1,147 @@
+from pathlib import Path
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Token bucket do lado do cliente para as cotas por minuto do Sheets (leitura
+# e escrita contam separado). Cada requisição consome um token; sem token, a
+# chamada espera o tempo exato até o próximo, em vez de estourar a cota e cair
+# no backoff de 429. Com o estado num SQLite compartilhado, os processos do
+# mesmo host (pipeline noturno, workers do Streamlit) dividem o mesmo balde.
+#
+# Cotas padrão do Sheets por usuário (a conta de serviço): 60 leituras e 60
+# escritas por minuto. Ajustáveis por SHEETS_READS_PER_MINUTE e
+# SHEETS_WRITES_PER_MINUTE; SHEETS_RATE_LIMIT_DB escolhe o arquivo do estado
+# (vazio = balde só do processo).
+
+READS_PER_MINUTE = 60
+WRITES_PER_MINUTE = 60
+
+# Rajada máxima, em fração da cota da janela (10 de 60 por minuto)
+BURST_FRACTION = 1 / 6
+
+DEFAULT_DB = Path(tempfile.gettempdir()) / "sheets_rate_limit.sqlite"
+
+
+class TokenBucket:
+    """
+    Balde de um processo para uma cota de limit requisições por janela de
+    window segundos. acquire() reserva um token e devolve quantos segundos
+    esperou por ele.
+
+    A reposição é (limit - capacity) / window por segundo: nem uma rajada com
+    o balde cheio somada à reposição passa de limit numa janela. O saldo pode
+    ficar negativo: cada chamada reserva o próximo token livre e dorme até
+    ele, então chamadas concorrentes saem espaçadas, na ordem em que chegaram.
+    """
+
+    def __init__(self, limit: float, window: float = 60.0, capacity: float | None = None):
+        self.capacity = capacity if capacity is not None else max(1.0, limit * BURST_FRACTION)
+        self.rate = max(limit - self.capacity, 1.0) / window
+        self._tokens = self.capacity
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def _reserve(self, now: float) -> float:
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate) - 1
+            self._updated = now
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self) -> float:
+        wait = self._reserve(time.time())
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class SQLiteTokenBucket(TokenBucket):
+    """
+    Mesmo balde, com saldo e instante da última atualização numa tabela SQLite.
+    BEGIN IMMEDIATE serializa as reservas de todos os processos que abrem o
+    mesmo arquivo; o sono acontece fora da transação.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        name: str,
+        limit: float,
+        window: float = 60.0,
+        capacity: float | None = None,
+    ):
+        super().__init__(limit, window, capacity)
+        self.path = Path(path)
+        self.name = name
+        self._local = threading.local()
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 não compartilha conexões entre threads: uma por thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _reserve(self, now: float) -> float:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            tokens, updated = row if row else (self.capacity, now)
+            tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate) - 1
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (self.name, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return max(0.0, -tokens / self.rate)
+
+
+class RateLimiter:
+    """Um balde para leituras e outro para escritas."""
+
+    def __init__(
+        self,
+        reads_per_minute: float = READS_PER_MINUTE,
+        writes_per_minute: float = WRITES_PER_MINUTE,
+        path: Path | None = DEFAULT_DB,
+    ):
+        if path is None:
+            self.buckets = {
+                "reads": TokenBucket(reads_per_minute),
+                "writes": TokenBucket(writes_per_minute),
+            }
+        else:
+            self.buckets = {
+                "reads": SQLiteTokenBucket(path, "reads", reads_per_minute),
+                "writes": SQLiteTokenBucket(path, "writes", writes_per_minute),
+            }
+
+    def acquire(self, kind: str) -> float:
+        return self.buckets[kind].acquire()
+
+
+def limiter_from_env() -> RateLimiter:
+    reads = float(os.getenv("SHEETS_READS_PER_MINUTE", READS_PER_MINUTE))
+    writes = float(os.getenv("SHEETS_WRITES_PER_MINUTE", WRITES_PER_MINUTE))
+    path = os.getenv("SHEETS_RATE_LIMIT_DB", str(DEFAULT_DB)).strip()
+
+    if path:
+        try:
+            return RateLimiter(reads, writes, Path(path))
+        except sqlite3.Error as e:
+            print("Estado compartilhado do limitador indisponível, usando só o processo:", repr(e))
+    return RateLimiter(reads, writes, None)
@@ -0,0 +1,83 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from services.event_index import mascara_isin
+from services.event_schema import CATEGORICAL_KEYS
+from services.periodos import calcular_lucro, criar_labels, inicio_periodo
+
+
+def construir_cubo(df: pd.DataFrame, columns: dict) -> pd.DataFrame:
+    """
+    Soma de valor e contagem de registros por (dia, tipo, cliente, forma,
+    categoria, produto). As colunas mantêm os nomes da base (data_col vira o dia),
+    então o cubo pode ser filtrado e agrupado como se fossem linhas brutas.
+    """
+    data_col = columns["data"]
+    valor_col = columns["valor"]
+    dimensoes = [columns[k] for k in CATEGORICAL_KEYS if columns.get(k)]
+
+    base = df[[data_col, valor_col, *dimensoes]].dropna(subset=[data_col])
+    chaves = [base[data_col].dt.floor("D").rename(data_col), *(base[c] for c in dimensoes)]
+
+    cubo = (
+        base.groupby(chaves, observed=True, dropna=False, sort=False)[valor_col]
+        .agg(["sum", "size"])
+        .rename(columns={"sum": valor_col, "size": "registros"})
+        .reset_index()
+    )
+    return cubo
+
+
+def filtrar_cubo(
+    cubo: pd.DataFrame,
+    data_col: str,
+    inicio: date | None,
+    fim: date | None,
+    selecoes: dict,
+) -> pd.DataFrame:
+    """Aplica ao cubo o mesmo período e as mesmas seleções ({coluna: valores}) dos filtros."""
+    mascara = np.ones(len(cubo), dtype=bool)
+
+    if inicio is not None and fim is not None:
+        dias = cubo[data_col].to_numpy(dtype="datetime64[us]")
+        mascara &= (dias >= np.datetime64(inicio, "us")) & (dias <= np.datetime64(fim, "us"))
+
+    for col, valores in selecoes.items():
+        if valores:
+            mascara &= mascara_isin(cubo[col], valores)
+
+    return cubo[mascara]
+
+
+def agregar_entrada_saida(
+    cubo: pd.DataFrame,
+    data_col: str,
+    valor_col: str,
+    tipo_col: str,
+    granularidade: str,
+) -> pd.DataFrame:
+    """
+    Série por período com entrada, saida, lucro, perc_lucro, cor e label, numa
+    única passada groupby(periodo, tipo).sum().unstack(tipo). Períodos sem
+    entrada nem saída ficam de fora.
+    """
+    tipo = cubo[tipo_col].astype("string")
+    tipo = tipo.mask(tipo.isin(["saída", "saida"]), "saida")
+    manter = tipo.isin(["entrada", "saida"]).fillna(False).to_numpy()
+
+    serie = (
+        cubo.loc[manter, valor_col]
+        .groupby([inicio_periodo(cubo.loc[manter, data_col], granularidade).rename("periodo"), tipo[manter]])
+        .sum()
+        .unstack(tipo_col, fill_value=0)
+        .reindex(columns=["entrada", "saida"], fill_value=0.0)
+        .astype("float64")
+        .rename_axis(columns=None)
+        .sort_index()
+        .reset_index()
+    )
+
+    serie = calcular_lucro(serie)
+    return criar_labels(serie, granularidade)
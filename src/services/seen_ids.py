@@ -0,0 +1,62 @@
+from contextlib import contextmanager
+from pathlib import Path
+import sqlite3
+
+# Índice local dos ids de mensagem do Telegram já levados à planilha
+# (data/telegram_seen.sqlite). Um id entra como "sending" antes da escrita e
+# vira "written" depois dela: reprocessar uma mensagem "written" é uma
+# consulta pela chave primária e nada mais; uma "sending" é de uma escrita
+# cujo resultado não se sabe (processo caiu, erro depois do envio) e precisa
+# ser conferida na coluna de ids da planilha antes de ir de novo.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen (
+    id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL
+)
+"""
+
+# parâmetros por consulta (o SQLite limita a quantidade de "?")
+_CHUNK = 900
+
+
+class SeenIds:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # conexão curta por operação: o índice é usado pela thread de escrita
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, ids) -> dict:
+        """{id: "sending" | "written"} dos ids já registrados."""
+        ids = list(ids)
+        found = {}
+        with self._connect() as conn:
+            for i in range(0, len(ids), _CHUNK):
+                chunk = ids[i:i + _CHUNK]
+                marks = ",".join("?" * len(chunk))
+                found.update(conn.execute(f"SELECT id, status FROM seen WHERE id IN ({marks})", chunk))
+        return found
+
+    def _mark(self, ids, status: str):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO seen (id, status) VALUES (?, ?)",
+                [(int(i), status) for i in ids],
+            )
+
+    def mark_sending(self, ids):
+        self._mark(ids, "sending")
+
+    def mark_written(self, ids):
+        self._mark(ids, "written")
@@ -0,0 +1,244 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import json
+import threading
+import time
+
+import gspread
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+from gspread.utils import absolute_range_name
+from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
+
+from services.rate_limiter import limiter_from_env
+
+# Camada única de acesso ao Google Sheets para o pipeline e o Streamlit:
+# um cliente por conta de serviço (sessão HTTP com pool de conexões), abas
+# abertas uma vez por processo, token bucket compartilhado entre processos
+# antes de cada requisição (services.rate_limiter), backoff para 429 como
+# última defesa e contadores de leituras/escritas por minuto (as cotas do
+# Sheets são por minuto).
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+SCOPES_READONLY = [
+    "https://www.googleapis.com/auth/spreadsheets.readonly",
+    "https://www.googleapis.com/auth/drive.readonly",
+]
+
+# Conexões mantidas abertas com a API (>= chamadas simultâneas da leitura em faixas)
+POOL_SIZE = 16
+
+# Leitura em faixas: linhas por faixa, faixas por chamada batchGet e
+# chamadas simultâneas em voo
+BATCH_ROWS = 5000
+RANGES_PER_CALL = 2
+FETCH_WORKERS = 4
+
+
+def _is_quota_429(e: APIError) -> bool:
+    s = str(e).lower()
+    return "429" in s or "quota" in s or "too many requests" in s or "rate" in s
+
+
+def with_backoff(max_retries=6, base=1.0, cap=32.0):
+    """
+    Exponential backoff simples para 429: 1s, 2s, 4s, 8s, 16s, 32s.
+    """
+    def deco(fn):
+        def wrapper(*args, **kwargs):
+            delay = base
+            for _ in range(max_retries):
+                try:
+                    return fn(*args, **kwargs)
+                except APIError as e:
+                    if _is_quota_429(e):
+                        time.sleep(min(delay, cap))
+                        delay *= 2
+                    else:
+                        raise
+            # última tentativa
+            return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+class QuotaCounter:
+    """
+    Requisições feitas ao Sheets pelo processo: leituras (GET) e escritas
+    (demais métodos) no último minuto, totais, quantos 429 foram recebidos e
+    quanto tempo as chamadas esperaram no limitador.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._recent = {"reads": deque(), "writes": deque()}
+        self._totals = {
+            "reads": 0,
+            "writes": 0,
+            "retries_429": 0,
+            "throttled": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    def record(self, kind: str, waited: float = 0.0):
+        now = time.monotonic()
+        with self._lock:
+            self._recent[kind].append(now)
+            self._totals[kind] += 1
+            if waited > 0:
+                self._totals["throttled"] += 1
+                self._totals["wait_seconds"] += waited
+                self._totals["max_wait_seconds"] = max(self._totals["max_wait_seconds"], waited)
+
+    def record_429(self):
+        with self._lock:
+            self._totals["retries_429"] += 1
+
+    def snapshot(self) -> dict:
+        limite = time.monotonic() - 60
+        with self._lock:
+            for recent in self._recent.values():
+                while recent and recent[0] < limite:
+                    recent.popleft()
+            return {
+                "reads_per_minute": len(self._recent["reads"]),
+                "writes_per_minute": len(self._recent["writes"]),
+                **self._totals,
+            }
+
+    def summary(self) -> str:
+        q = self.snapshot()
+        return (
+            f"Sheets API: {q['reads']} leituras, {q['writes']} escritas, {q['retries_429']} respostas 429 "
+            f"| último minuto: {q['reads_per_minute']} leituras, {q['writes_per_minute']} escritas "
+            f"| limitador: {q['throttled']} chamadas esperaram {q['wait_seconds']:.1f}s "
+            f"(máx. {q['max_wait_seconds']:.1f}s)"
+        )
+
+
+quota = QuotaCounter()
+
+
+class SheetsHTTPClient(HTTPClient):
+    """
+    HTTPClient do gspread com pool de conexões maior. Toda requisição passa
+    pelo limitador, é registrada em quota e repete com backoff se vier 429.
+    """
+
+    def __init__(self, auth, session=None):
+        super().__init__(auth, session)
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        self.session.mount("https://", adapter)
+
+    @with_backoff(max_retries=6, base=1.0)
+    def request(self, method, endpoint, *args, **kwargs):
+        kind = "reads" if method.upper() == "GET" else "writes"
+        quota.record(kind, _limiter().acquire(kind))
+        try:
+            return super().request(method, endpoint, *args, **kwargs)
+        except APIError as e:
+            if _is_quota_429(e):
+                quota.record_429()
+            raise
+
+
+@functools.lru_cache(maxsize=None)
+def _limiter():
+    return limiter_from_env()
+
+
+@functools.lru_cache(maxsize=None)
+def _client(service_account_json: str, scopes: tuple[str, ...]) -> gspread.Client:
+    creds = Credentials.from_service_account_info(json.loads(service_account_json), scopes=list(scopes))
+    return gspread.authorize(creds, http_client=SheetsHTTPClient)
+
+
+@functools.lru_cache(maxsize=32)
+def _worksheet(
+    service_account_json: str,
+    scopes: tuple[str, ...],
+    sheet_id: str,
+    worksheet_name: str,
+) -> gspread.Worksheet:
+    sh = _client(service_account_json, scopes).open_by_key(sheet_id)
+    return sh.worksheet(worksheet_name)
+
+
+def open_worksheet(sheet_id, worksheet_name, service_account, scopes=SCOPES) -> gspread.Worksheet:
+    """
+    Aba da planilha, aberta só na primeira chamada do processo: as seguintes
+    reaproveitam o cliente autenticado e os metadados, sem requisições extras.
+    service_account é o JSON da conta de serviço (texto) ou o dict equivalente.
+    """
+    if isinstance(service_account, str):
+        service_account = json.loads(service_account)
+    key = json.dumps(dict(service_account), sort_keys=True)
+    return _worksheet(key, tuple(scopes), sheet_id, worksheet_name)
+
+
+def forget_worksheets():
+    """Descarta as abas em cache (ex.: depois de renomear ou recriar uma aba)."""
+    _worksheet.cache_clear()
+
+
+def batch_get_values(ws, ranges: list[str]) -> list[list[list[str]]]:
+    """
+    Valores de várias faixas A1 da aba numa única chamada 'values.batchGet',
+    na mesma ordem de ranges (faixa sem dados volta como lista vazia). O
+    backoff para 429 fica no SheetsHTTPClient, como em toda requisição.
+    """
+    resposta = ws.spreadsheet.values_batch_get([absolute_range_name(ws.title, r) for r in ranges])
+    return [faixa.get("values", []) for faixa in resposta.get("valueRanges", [])]
+
+
+def iter_row_ranges(
+    ws,
+    start_row: int,
+    last_row: int,
+    last_col: str,
+    batch_rows: int = BATCH_ROWS,
+    ranges_per_call: int = RANGES_PER_CALL,
+    workers: int = FETCH_WORKERS,
+):
+    """
+    Lê as linhas start_row..last_row da aba em faixas de batch_rows linhas
+    (A2:J5001, A5002:J10001, ...), com até workers chamadas batchGet em paralelo,
+    cada uma com ranges_per_call faixas. Gera (primeira linha, valores) faixa a
+    faixa na ordem da planilha; só workers chamadas ficam em memória por vez.
+
+    Cada requisição tem o próprio backoff para 429, então uma faixa recusada
+    por cota espera e repete sozinha, sem refazer as que já chegaram.
+    """
+    faixas = [
+        (first, min(first + batch_rows - 1, last_row))
+        for first in range(start_row, last_row + 1, batch_rows)
+    ]
+    chamadas = iter([faixas[i:i + ranges_per_call] for i in range(0, len(faixas), ranges_per_call)])
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sheets-fetch")
+    pendentes = deque()
+
+    def _enviar():
+        chamada = next(chamadas, None)
+        if chamada is not None:
+            ranges = [f"A{first}:{last_col}{last}" for first, last in chamada]
+            pendentes.append((chamada, pool.submit(batch_get_values, ws, ranges)))
+
+    try:
+        for _ in range(workers):
+            _enviar()
+        while pendentes:
+            chamada, futuro = pendentes.popleft()
+            valores = futuro.result()
+            _enviar()
+            for (first, _), rows in zip(chamada, valores):
+                yield first, rows
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
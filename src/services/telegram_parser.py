@@ -0,0 +1,183 @@
+from functools import lru_cache
+import re
+import unicodedata
+
+# Parser das mensagens do canal, com tudo montado uma vez no import: tabelas
+# de aliases, padrões compilados e a tabela que tira acentos das chaves. É o
+# laço quente das leituras longas de histórico (telegram_to_sheets), então
+# cada linha é tratada com operações de str e no máximo uma busca de regex.
+#
+# Formatos aceitos (uma chave por linha, ou tudo numa linha separado por ";"):
+#   Tipo: saida            Valor = 12,50          tipo=saida; valor=10; cliente=Ana
+#   💰 Valor: 10           - Cliente: Ana         DESCRIÇÃO: almoço / Descricao: almoço
+# e, numa mensagem com várias linhas, linhas com vários "chave=valor;" seguidos
+# ("Valor=10; Cliente=Ana"). Essas só são cortadas quando começam por um campo
+# de valor curto (não Descrição, que é texto livre), e um "; chave:" no meio
+# da linha nunca sobrescreve um campo que tem linha própria na mensagem.
+
+FIELDS = ("Tipo", "Valor", "Descrição", "Cliente", "Forma de Pagamento", "Data")
+
+# chaves já em minúsculas, sem acento e com espaços simples
+FIELD_ALIASES = {
+    "tipo": "Tipo",
+    "valor": "Valor",
+    "descricao": "Descrição",
+    "cliente": "Cliente",
+    "forma de pagamento": "Forma de Pagamento",
+    "forma_pagamento": "Forma de Pagamento",
+    "forma": "Forma de Pagamento",
+    "pagamento": "Forma de Pagamento",
+    "data": "Data",
+}
+
+# Tokenizador de uma passada: cada casamento é (chave, separador, valor) de
+# uma linha (ou de um trecho entre ";" nas mensagens de uma linha só); a
+# chave vai até o primeiro ":" ou "=". Linhas sem separador não casam.
+_FIELD_LINE = re.compile(r"(?:^|(?<=[\n\r]))([^:=\n\r]+)([:=])([^\n\r]*)")
+_FIELD_INLINE = re.compile(r"(?:^|(?<=;))([^:=;]+)([:=])([^;]*)")
+_SEPARATOR = re.compile(r"[:=]")
+_TIPO_E_TEXTO = re.compile(r"^\s*(sa[ií]da|saida|entrada)\s*:\s*(.*)\s*$", flags=re.IGNORECASE)
+
+# campos de texto livre: um ";" no valor é parte do texto
+_FREE_TEXT = frozenset({"Descrição"})
+
+# emoji, marcadores ("-", "•", "*") e pontuação em volta da chave
+_KEY_DECORATION = re.compile(r"^[\W_]+|[\W_]+$")
+
+def _strip_accents_table() -> dict:
+    table = {}
+    for cp in range(0xC0, 0x250):
+        ch = chr(cp)
+        base = unicodedata.normalize("NFKD", ch)[0]
+        if base != ch and base.isascii():
+            table[cp] = base
+    return table
+
+
+_NO_ACCENTS = _strip_accents_table()
+
+
+# as chaves escritas no canal se repetem muito ("Tipo", "Valor", ...): cada
+# grafia é normalizada uma vez só
+@lru_cache(maxsize=4096)
+def _field_for(key_raw: str):
+    key = " ".join(key_raw.lower().split()).translate(_NO_ACCENTS)
+    field = FIELD_ALIASES.get(key)
+    if field is None and key:
+        field = FIELD_ALIASES.get(" ".join(_KEY_DECORATION.sub("", key).split()))
+    return field
+
+
+def _split_inline(line: str, keep: frozenset | set = frozenset()) -> list[str]:
+    # corta a linha só nos ";" seguidos de uma chave conhecida que não esteja
+    # em keep: em "Descrição: arroz; feijão" o ";" continua no valor
+    parts = []
+    for piece in line.split(";"):
+        m = _SEPARATOR.search(piece)
+        field = _field_for(piece[:m.start()]) if m is not None else None
+        if parts and (field is None or field in keep):
+            parts[-1] += ";" + piece
+        else:
+            parts.append(piece)
+    return parts
+
+
+def parse_tipo_e_texto(raw_text):
+    m = _TIPO_E_TEXTO.match(raw_text)
+    if not m:
+        return None, None
+    tipo_raw = m.group(1).lower()
+    tipo = "saida" if tipo_raw.startswith("sa") else "entrada"
+    conteudo = m.group(2).strip()
+    if len(conteudo) >= 2:
+        if (conteudo[0] == '"' and conteudo[-1] == '"') or (conteudo[0] == "'" and conteudo[-1] == "'"):
+            conteudo = conteudo[1:-1].strip()
+    return tipo, conteudo
+
+
+def parse_telegram_payload(raw_text):
+    """
+    Campos do lançamento (dict com as chaves de FIELDS, None se ausente) ou
+    None se a mensagem não tiver nem Tipo nem Valor. A chave vale até o
+    primeiro ":" ou "="; valores repetidos ficam com o último.
+    """
+    if raw_text is None:
+        return None
+    text_val = str(raw_text).strip()
+    if text_val == "":
+        return None
+
+    out = dict.fromkeys(FIELDS)
+    if "\n" in text_val or "\r" in text_val:
+        linhas = _FIELD_LINE.findall(text_val)
+        # campos com linha própria não são sobrescritos por um "; chave:" de outra linha
+        proprios = {_field_for(key_raw) for key_raw, _, _ in linhas}
+        for key_raw, sep, value in linhas:
+            field = _field_for(key_raw)
+            if ";" in value and field is not None and field not in _FREE_TEXT:
+                # vários "chave=valor;" na mesma linha
+                for part in _split_inline(key_raw + sep + value, proprios):
+                    m = _SEPARATOR.search(part)
+                    part_field = _field_for(part[:m.start()])
+                    if part_field is not None:
+                        out[part_field] = part[m.end():].strip().strip('"').strip("'")
+                continue
+            if field is not None:
+                out[field] = value.strip().strip('"').strip("'")
+    else:
+        for key_raw, _, value in _FIELD_INLINE.findall(text_val):
+            field = _field_for(key_raw)
+            if field is not None:
+                out[field] = value.strip().strip('"').strip("'")
+
+    if not out["Tipo"] and not out["Valor"]:
+        return None
+    return out
+
+
+def normalize_date_str(date_in):
+    # Normaliza datas para YYYY-MM-DD
+    if date_in is None:
+        return ""
+    s = str(date_in).strip()
+    if not s:
+        return ""
+    s = s.replace(".", "-").replace("/", "-")
+    parts = [p for p in s.split("-") if p]
+    if len(parts) != 3:
+        return s
+    if len(parts[0]) == 4:  # YYYY-MM-DD
+        yyyy = parts[0]
+        mm = parts[1].zfill(2)
+        dd = parts[2].zfill(2)
+        return yyyy + "-" + mm + "-" + dd
+    # DD-MM-YYYY
+    dd = parts[0].zfill(2)
+    mm = parts[1].zfill(2)
+    yyyy = parts[2]
+    if len(yyyy) == 2:
+        yyyy = "20" + yyyy
+    return yyyy + "-" + mm + "-" + dd
+
+
+def message_row(text, sent_date: str = ""):
+    """
+    Linha da planilha, na ordem de FIELDS, para o texto de uma mensagem, ou
+    None se não for um lançamento. Sem Data no texto, usa sent_date (YYYY-MM-DD).
+    """
+    payload = parse_telegram_payload(text)
+    if payload is None:
+        return None
+
+    data_norm = normalize_date_str(payload.get("Data"))
+    if str(data_norm).strip() == "":
+        data_norm = sent_date
+
+    return [
+        payload.get("Tipo") or "",
+        payload.get("Valor") or "",
+        payload.get("Descrição") or "",
+        payload.get("Cliente") or "",
+        payload.get("Forma de Pagamento") or "",
+        data_norm or "",
+    ]
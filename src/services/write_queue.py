@@ -0,0 +1,248 @@
+from contextlib import contextmanager
+from pathlib import Path
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+# Fila local e durável (SQLite em data/) para os lançamentos do cadastro. O
+# formulário só grava a linha na fila e volta na hora; uma thread por processo
+# envia as linhas pendentes à planilha numa única chamada append_rows
+# (values.append) a cada FLUSH_SECONDS ou quando juntar FLUSH_ROWS linhas.
+#
+# Estados: pending -> sending -> flushed. Uma falha devolve o lote para
+# pending (com o erro guardado) e ele vai de novo depois de uma espera que
+# dobra a cada tentativa, sem segurar as linhas de trás; depois de
+# MAX_ATTEMPTS tentativas a linha fica em failed até ser reenviada à mão
+# (retry_failed). Vários processos podem abrir a mesma fila: cada lote é
+# reservado numa transação antes de ser enviado.
+#
+# append_rows não é idempotente: um timeout depois de a planilha já ter
+# gravado, ou um processo que morre logo depois do envio, deixaria a linha
+# para ir de novo. Cada linha leva uma etiqueta própria na coluna oculta
+# TAG_COL, e as que já foram tentadas antes só são reenviadas se a etiqueta
+# não estiver na planilha.
+
+FLUSH_SECONDS = 3.0
+FLUSH_ROWS = 20
+MAX_BATCH_ROWS = 500
+
+# Lote em "sending" há mais tempo que isso é de um processo que morreu no meio
+STALE_SENDING_SECONDS = 300
+
+# Tentativas antes de a linha ir para failed, e teto da espera entre elas
+MAX_ATTEMPTS = 8
+MAX_RETRY_SECONDS = 300
+
+# Coluna oculta da planilha com a etiqueta de cada linha enviada pela fila
+TAG_COL = "ID Cadastro"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    row TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created REAL NOT NULL,
+    claimed REAL,
+    flushed REAL,
+    error TEXT,
+    tag TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_try REAL NOT NULL DEFAULT 0
+)
+"""
+
+# filas criadas antes das etiquetas e das tentativas
+_MIGRATIONS = {
+    "tag": "ALTER TABLE queue ADD COLUMN tag TEXT",
+    "attempts": "ALTER TABLE queue ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0",
+    "next_try": "ALTER TABLE queue ADD COLUMN next_try REAL NOT NULL DEFAULT 0",
+}
+
+
+def _release_stale(conn, now: float):
+    # o envio do processo que morreu pode ter chegado à planilha: conta como
+    # tentativa, e a etiqueta é conferida antes de ir de novo
+    return conn.execute(
+        "UPDATE queue SET status = 'pending', claimed = NULL, attempts = attempts + 1 "
+        "WHERE status = 'sending' AND claimed < ?",
+        (now - STALE_SENDING_SECONDS,),
+    ).rowcount
+
+
+class WriteQueue:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._wake = threading.Event()
+        self._worker = None
+        self._tag_col = None
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+            existentes = {row[1] for row in conn.execute("PRAGMA table_info(queue)")}
+            for coluna, sql in _MIGRATIONS.items():
+                if coluna not in existentes:
+                    conn.execute(sql)
+            conn.execute("UPDATE queue SET tag = lower(hex(randomblob(8))) WHERE tag IS NULL")
+            conn.execute("CREATE INDEX IF NOT EXISTS queue_status ON queue (status, id)")
+
+    @contextmanager
+    def _connect(self):
+        # conexão curta por operação: a fila é usada por várias threads e processos
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, row: list) -> int:
+        """Guarda a linha (na ordem das colunas da planilha) e devolve o id na fila."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO queue (row, created, tag) VALUES (?, ?, ?)",
+                (json.dumps(row, ensure_ascii=False), time.time(), uuid.uuid4().hex[:16]),
+            )
+        self._wake.set()
+        return cur.lastrowid
+
+    def status(self, ids=None) -> dict:
+        """Quantas linhas há em cada estado e, para os ids pedidos, o estado de cada um."""
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM queue GROUP BY status").fetchall())
+            by_id = {}
+            if ids:
+                marks = ",".join("?" * len(ids))
+                by_id = {
+                    row_id: {"status": status, "error": error}
+                    for row_id, status, error in conn.execute(
+                        f"SELECT id, status, error FROM queue WHERE id IN ({marks})", list(ids)
+                    )
+                }
+        return {"counts": counts, "ids": by_id}
+
+    def _claim(self, max_rows: int) -> list[tuple]:
+        """Reserva até max_rows pendentes: [(id, linha, etiqueta, tentativas anteriores)]."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            _release_stale(conn, now)
+            rows = conn.execute(
+                "SELECT id, row, tag, attempts FROM queue "
+                "WHERE status = 'pending' AND next_try <= ? ORDER BY id LIMIT ?",
+                (now, max_rows),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE queue SET status = 'sending', claimed = ? WHERE id = ?",
+                [(now, row[0]) for row in rows],
+            )
+        return [(row_id, json.loads(row), tag, attempts) for row_id, row, tag, attempts in rows]
+
+    def _finish(self, ids: list[int], error: str | None = None):
+        now = time.time()
+        with self._connect() as conn:
+            if error is None:
+                conn.executemany(
+                    "UPDATE queue SET status = 'flushed', flushed = ?, error = NULL WHERE id = ?",
+                    [(now, row_id) for row_id in ids],
+                )
+                return
+            conn.executemany(
+                "UPDATE queue SET attempts = attempts + 1, claimed = NULL, error = ?, "
+                "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END, "
+                "next_try = ? + MIN(?, ? * (1 << attempts)) WHERE id = ?",
+                [
+                    (error, MAX_ATTEMPTS, now, MAX_RETRY_SECONDS, FLUSH_SECONDS, row_id)
+                    for row_id in ids
+                ],
+            )
+
+    def retry_failed(self) -> int:
+        """Devolve as linhas em failed para a fila, com as tentativas zeradas."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE queue SET status = 'pending', attempts = 0, next_try = 0 WHERE status = 'failed'"
+            )
+        self._wake.set()
+        return cur.rowcount
+
+    def _due(self) -> bool:
+        now = time.time()
+        with self._connect() as conn:
+            # sem isso, um lote largado em sending só voltaria com um envio novo;
+            # liberado, ele já esperou demais e vai no próximo envio
+            liberadas = _release_stale(conn, now)
+            n, oldest = conn.execute(
+                "SELECT COUNT(*), MIN(created) FROM queue WHERE status = 'pending' AND next_try <= ?",
+                (now,),
+            ).fetchone()
+        return liberadas > 0 or n >= FLUSH_ROWS or (n > 0 and now - oldest >= FLUSH_SECONDS)
+
+    def _tag_column(self, ws) -> int:
+        # índice (1-based) de TAG_COL, criada oculta no fim do cabeçalho se faltar
+        if self._tag_col is None:
+            header = [str(h).strip() for h in ws.row_values(1)]
+            if TAG_COL not in header:
+                col = len(header) + 1
+                if col > ws.col_count:
+                    ws.add_cols(col - ws.col_count)
+                # só a célula nova: não regrava colunas que outro processo acabou de criar
+                ws.update_cell(1, col, TAG_COL)
+                ws.hide_columns(col - 1, col)
+                header.append(TAG_COL)
+            self._tag_col = header.index(TAG_COL) + 1
+        return self._tag_col
+
+    def flush(self, get_worksheet) -> int:
+        """
+        Envia um lote de pendentes numa única chamada append_rows. Linhas de uma
+        tentativa anterior cujo resultado não se sabe só vão se a etiqueta delas
+        não estiver na planilha. Devolve quantas linhas saíram da fila (gravadas
+        agora ou já encontradas na planilha).
+        """
+        claimed = self._claim(MAX_BATCH_ROWS)
+        if not claimed:
+            return 0
+        ids = [row_id for row_id, _, _, _ in claimed]
+        try:
+            ws = get_worksheet()
+            tag_col = self._tag_column(ws)
+
+            ja_gravadas = []
+            if any(attempts for _, _, _, attempts in claimed):
+                na_planilha = set(ws.col_values(tag_col)[1:])
+                ja_gravadas = [row_id for row_id, _, tag, _ in claimed if tag in na_planilha]
+                claimed = [c for c in claimed if c[0] not in set(ja_gravadas)]
+
+            rows = [
+                (list(row) + [""] * tag_col)[:tag_col - 1] + [tag]
+                for _, row, tag, _ in claimed
+            ]
+            if rows:
+                ws.append_rows(rows, value_input_option="USER_ENTERED")
+        except Exception as e:
+            self._finish(ids, error=repr(e))
+            raise
+        self._finish(ids)
+        return len(ids)
+
+    def start_worker(self, get_worksheet):
+        """Thread de envio em segundo plano (uma por fila e processo)."""
+        if self._worker is not None and self._worker.is_alive():
+            return self._worker
+
+        def _loop():
+            while True:
+                self._wake.wait(timeout=1.0)
+                self._wake.clear()
+                try:
+                    while self._due() and self.flush(get_worksheet):
+                        pass
+                except Exception as e:
+                    print("Falha ao enviar lançamentos da fila:", repr(e))
+                    time.sleep(FLUSH_SECONDS)
+
+        self._worker = threading.Thread(target=_loop, name="cadastro-write-queue", daemon=True)
+        self._worker.start()
+        return self._worker
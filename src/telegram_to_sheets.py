@@ -1,16 +1,34 @@
 from pathlib import Path
+import argparse
+import asyncio
 import json
 import re
 import os
-import time
+import signal
 
-from telethon import TelegramClient
+from telethon import TelegramClient, events
 from telethon.sessions import StringSession
 
-import gspread
-from gspread.exceptions import APIError
 from gspread.utils import rowcol_to_a1
-from google.oauth2.service_account import Credentials
+
+from services.event_schema import MESSAGE_ID_COL
+from services.seen_ids import SeenIds
+from services.sheets_client import open_worksheet, quota
+from services.telegram_parser import message_row
+
+# Modo contínuo (--daemon): o lote de mensagens novas vai para a planilha a
+# cada DAEMON_FLUSH_SECONDS ou assim que juntar DAEMON_FLUSH_ROWS linhas
+DAEMON_FLUSH_SECONDS = 5.0
+DAEMON_FLUSH_ROWS = 50
+
+# Leitura do histórico (execução normal e alcance do --daemon): linhas por
+# chamada batch_write_rows; last_id avança a cada bloco gravado
+WRITE_CHUNK_ROWS = 500
+
+REQUIRED_HEADERS = ["Tipo", "Valor", "Descrição", "Cliente", "Forma de Pagamento", "Data", MESSAGE_ID_COL]
+
+# Colunas criadas já ocultas na planilha
+HIDDEN_HEADERS = (MESSAGE_ID_COL,)
 
 
 def julius_start_telegram_client(client_obj):
@@ -34,76 +52,6 @@ def _find_base_dir():
         return here_dir.parent
     return here_dir
 
-def parse_tipo_e_texto(raw_text):
-    m = re.match(r"^\s*(sa[ií]da|saida|entrada)\s*:\s*(.*)\s*$", raw_text, flags=re.IGNORECASE)
-    if not m:
-        return None, None
-    tipo_raw = m.group(1).lower()
-    tipo = "saida" if tipo_raw.startswith("sa") else "entrada"
-    conteudo = m.group(2).strip()
-    if len(conteudo) >= 2:
-        if (conteudo[0] == '"' and conteudo[-1] == '"') or (conteudo[0] == "'" and conteudo[-1] == "'"):
-            conteudo = conteudo[1:-1].strip()
-    return tipo, conteudo
-
-def parse_telegram_payload(raw_text):
-    # Parses messages like:
-    # Tipo: String
-    # Valor: Decimal
-    # Descrição: String
-    # Cliente: String
-    # Forma de Pagamento: String
-    if raw_text is None:
-        return None
-    text_val = str(raw_text).strip()
-    if text_val == "":
-        return None
-
-    field_aliases = {
-        "tipo": "Tipo",
-        "valor": "Valor",
-        "descrição": "Descrição",
-        "descricao": "Descrição",
-        "cliente": "Cliente",
-        "forma de pagamento": "Forma de Pagamento",
-        "forma_pagamento": "Forma de Pagamento",
-        "forma": "Forma de Pagamento",
-        "pagamento": "Forma de Pagamento",
-        "data": "Data",
-    }
-    out = {
-        "Tipo": None,
-        "Valor": None,
-        "Descrição": None,
-        "Cliente": None,
-        "Forma de Pagamento": None,
-        "Data": None,
-    }
-
-    # Split por linhas; também aceita uma única linha com ';'
-    parts = []
-    for chunk in re.split(r"[\n\r]+", text_val):
-        chunk2 = chunk.strip()
-        if chunk2 != "":
-            parts.append(chunk2)
-    if len(parts) == 1 and ";" in parts[0]:
-        parts = [p.strip() for p in parts[0].split(";") if p.strip()]
-
-    for part in parts:
-        m = re.match(r"^\s*([^:=]+?)\s*[:=]\s*(.*)\s*$", part)
-        if not m:
-            continue
-        key_raw = m.group(1).strip().lower()
-        val_raw = m.group(2).strip()
-        val_raw = val_raw.strip('"').strip("'")
-        key_norm = re.sub(r"\s+", " ", key_raw)
-        if key_norm in field_aliases:
-            out[field_aliases[key_norm]] = val_raw
-
-    if not out.get("Tipo") and not out.get("Valor"):
-        return None
-    return out
-
 def load_state(state_file):
     try:
         with open(state_file, "r", encoding="utf-8") as state_f:
@@ -119,17 +67,21 @@ def save_state(state_file, state_data):
     with open(state_file, "w", encoding="utf-8") as state_f:
         json.dump(state_data, state_f)
 
-def ensure_headers(ws, required_headers):
+def ensure_headers(ws, required_headers, hidden_headers=()):
     # Garante a linha de cabeçalho e retorna o mapa de colunas
     existing = ws.row_values(1)
     existing_norm = [str(x).strip() for x in existing]
-    changed = False
+    added = []
     for h in required_headers:
         if h not in existing_norm:
             existing_norm.append(h)
-            changed = True
-    if changed:
+            added.append(h)
+    if added:
         ws.update("A1", [existing_norm])
+    for h in added:
+        if h in hidden_headers:
+            # hide_columns usa índice 0-based, fim exclusivo
+            ws.hide_columns(existing_norm.index(h), existing_norm.index(h) + 1)
     return {h: (existing_norm.index(h) + 1) for h in existing_norm}
 
 def first_empty_row(ws, key_col_idx):
@@ -137,85 +89,25 @@ def first_empty_row(ws, key_col_idx):
     col_vals = ws.col_values(key_col_idx)
     return len(col_vals) + 1
 
-def normalize_date_str(date_in):
-    # Normaliza datas para YYYY-MM-DD
-    if date_in is None:
-        return ""
-    s = str(date_in).strip()
-    if not s:
-        return ""
-    s = s.replace(".", "-").replace("/", "-")
-    parts = [p for p in s.split("-") if p]
-    if len(parts) != 3:
-        return s
-    if len(parts[0]) == 4:  # YYYY-MM-DD
-        yyyy = parts[0]
-        mm = parts[1].zfill(2)
-        dd = parts[2].zfill(2)
-        return yyyy + "-" + mm + "-" + dd
-    # DD-MM-YYYY
-    dd = parts[0].zfill(2)
-    mm = parts[1].zfill(2)
-    yyyy = parts[2]
-    if len(yyyy) == 2:
-        yyyy = "20" + yyyy
-    return yyyy + "-" + mm + "-" + dd
-
-def connect_worksheet(sheet_id, worksheet_name, service_account_json):
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    service_account_info = json.loads(service_account_json)
-    creds = Credentials.from_service_account_info(service_account_info, scopes=scopes)
-    gc = gspread.authorize(creds)
-    sh = gc.open_by_key(sheet_id)
-    ws = sh.worksheet(worksheet_name)
-    return ws
-
 # -------------------- NOVOS HELPERS (backoff e batch) --------------------
 
-def _is_quota_429(e: APIError) -> bool:
-    s = str(e).lower()
-    return "429" in s or "quota" in s or "too many requests" in s or "rate" in s
-
-def with_backoff(max_retries=6, base=1.0, cap=32.0):
-    """
-    Exponential backoff simples para 429: 1s, 2s, 4s, 8s, 16s, 32s.
-    """
-    def deco(fn):
-        def wrapper(*args, **kwargs):
-            delay = base
-            for _ in range(max_retries):
-                try:
-                    return fn(*args, **kwargs)
-                except APIError as e:
-                    if _is_quota_429(e):
-                        time.sleep(min(delay, cap))
-                        delay *= 2
-                    else:
-                        raise
-            # última tentativa
-            return fn(*args, **kwargs)
-        return wrapper
-    return deco
-
 def _col_letter(col_idx: int) -> str:
     # Converte índice numérico de coluna (1-based) para letra A1
     a1 = rowcol_to_a1(1, col_idx)  # ex.: "C1"
     m = re.match(r"([A-Z]+)", a1)
     return m.group(1) if m else "A"
 
-@with_backoff(max_retries=6, base=1.0)
 def batch_write_rows(ws, col_idx_map, rows_matrix, start_row):
     """
     Escreve um conjunto de N linhas usando UMA chamada 'values.batchUpdate',
     escrevendo coluna a coluna (permite colunas não contíguas sem sobrescrever outras).
-    rows_matrix: lista de linhas, onde cada linha segue a ordem:
-      ["Tipo", "Valor", "Descrição", "Cliente", "Forma de Pagamento", "Data"]
+    rows_matrix: lista de linhas, onde cada linha segue a ordem de REQUIRED_HEADERS:
+      ["Tipo", "Valor", "Descrição", "Cliente", "Forma de Pagamento", "Data", "ID Mensagem"]
     start_row: número da primeira linha (1-based) onde começar a escrever.
+    O backoff para 429 fica no cliente compartilhado (services.sheets_client);
+    como as faixas são fixas, repetir a chamada regrava as mesmas células.
     """
-    headers = ["Tipo", "Valor", "Descrição", "Cliente", "Forma de Pagamento", "Data"]
+    headers = REQUIRED_HEADERS
 
     data_entries = []
     for col_pos, header in enumerate(headers):
@@ -236,9 +128,272 @@ def batch_write_rows(ws, col_idx_map, rows_matrix, start_row):
 # ------------------------------------------------------------------------
 
 
-async def main():
+def message_to_row(msg):
+    """Linha da planilha (na ordem de REQUIRED_HEADERS) para a mensagem, ou None se não for um lançamento."""
+    # sem Data no texto, vale o dia do envio (fuso local)
+    data_envio = msg.date.astimezone().strftime("%Y-%m-%d") if msg.date else ""
+    linha = message_row((msg.message or "").strip(), data_envio)
+    if linha is None:
+        return None
+    return linha + [msg.id]
+
+
+class MicroBatcher:
+    """
+    Buffer das mensagens a gravar (histórico e modo contínuo). flush() grava as linhas
+    pendentes com UMA chamada batch_write_rows e só então avança last_id no
+    state.json; se a escrita falhar, as linhas voltam para o buffer e vão no
+    próximo flush. run() dispara o flush a cada flush_seconds ou quando o
+    buffer chega a flush_rows linhas, até stop ser sinalizado.
+
+    Com seen (services.seen_ids), cada linha leva o id da mensagem e nenhuma
+    vai duas vezes para a planilha: ids já gravados são pulados, e os de uma
+    escrita interrompida ("sending") são conferidos na coluna de ids da aba.
+    O índice é local (não vai para o git): na primeira escrita do processo os
+    ids que ele não conhece também são conferidos na aba, uma vez, porque a
+    escrita interrompida pode ter sido de outra máquina.
+    """
+
+    def __init__(
+        self,
+        ws,
+        col_idx_map,
+        state_file,
+        state_data,
+        flush_seconds=DAEMON_FLUSH_SECONDS,
+        flush_rows=DAEMON_FLUSH_ROWS,
+        seen=None,
+    ):
+        self.ws = ws
+        self.col_idx_map = col_idx_map
+        self.state_file = state_file
+        self.state_data = state_data
+        self.flush_seconds = flush_seconds
+        self.flush_rows = flush_rows
+        self.seen = seen
+        self._conferido = False
+
+        self.last_id = int(state_data.get("last_id", 0))
+        self._max_id = self.last_id
+        self._rows = []
+        self._ids = set()
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    def add(self, msg_id, linha):
+        """Registra a mensagem (linha None = não é lançamento, só avança last_id)."""
+        if msg_id <= self.last_id or msg_id in self._ids:
+            return
+        self._ids.add(msg_id)
+        self._max_id = max(self._max_id, msg_id)
+        if linha is not None:
+            self._rows.append(linha)
+            if len(self._rows) >= self.flush_rows:
+                self._full.set()
+
+    def _ids_in_sheet(self):
+        col = self.col_idx_map.get(MESSAGE_ID_COL)
+        if col is None:
+            return set()
+        ids = set()
+        for value in self.ws.col_values(col, value_render_option="UNFORMATTED_VALUE")[1:]:
+            try:
+                ids.add(int(float(value)))
+            except (TypeError, ValueError):
+                continue
+        return ids
+
+    def _unsent(self, rows):
+        # o id da mensagem é o último campo da linha
+        status = self.seen.lookup(row[-1] for row in rows)
+        if self._conferido:
+            incertos = [i for i, st in status.items() if st == "sending"]
+        else:
+            incertos = [row[-1] for row in rows if status.get(row[-1]) != "written"]
+        if incertos:
+            # uma leitura da coluna de ids decide o que a escrita interrompida gravou
+            na_planilha = self._ids_in_sheet()
+            self.seen.mark_written([i for i in incertos if i in na_planilha])
+            status.update({i: "written" for i in incertos if i in na_planilha})
+        return [row for row in rows if status.get(row[-1]) != "written"]
+
+    def _write(self, rows):
+        if self.seen is not None:
+            rows = self._unsent(rows)
+            if not rows:
+                return 0
+            self._conferido = True
+            self.seen.mark_sending([row[-1] for row in rows])
+
+        # a primeira linha vazia é relida a cada escrita: o cadastro do
+        # Streamlit também acrescenta linhas na aba enquanto o processo roda
+        start_row = first_empty_row(self.ws, self.col_idx_map.get("Data", 1))
+        batch_write_rows(self.ws, self.col_idx_map, rows, start_row)
+
+        if self.seen is not None:
+            self.seen.mark_written([row[-1] for row in rows])
+        return len(rows)
+
+    async def flush(self):
+        async with self._lock:
+            if self._max_id == self.last_id:
+                return 0
+            rows, ids, max_id = self._rows, self._ids, self._max_id
+            self._rows, self._ids = [], set()
+            self._full.clear()
+            gravadas = 0
+            try:
+                if rows:
+                    # gspread é bloqueante: a escrita roda fora do loop do Telethon
+                    gravadas = await asyncio.to_thread(self._write, rows)
+            except Exception:
+                self._rows = rows + self._rows
+                self._ids |= ids
+                raise
+
+            self.last_id = max_id
+            self.state_data["last_id"] = max_id
+            save_state(self.state_file, self.state_data)
+            return gravadas
+
+    async def run(self, stop):
+        while not stop.is_set():
+            esperas = [asyncio.ensure_future(self._full.wait()), asyncio.ensure_future(stop.wait())]
+            await asyncio.wait(esperas, timeout=self.flush_seconds, return_when=asyncio.FIRST_COMPLETED)
+            for espera in esperas:
+                espera.cancel()
+            try:
+                n = await self.flush()
+                if n:
+                    print("Linhas gravadas:", n, "| last_id:", self.last_id)
+            except Exception as e:
+                print("Falha ao gravar o lote, nova tentativa no próximo flush:", repr(e))
+
+        # última gravação antes de sair
+        n = await self.flush()
+        print("Encerrando. Linhas gravadas no último flush:", n, "| last_id:", self.last_id)
+
+
+async def backfill(client, entity, batcher, chunk_rows=WRITE_CHUNK_ROWS):
+    """
+    Copia as mensagens depois de batcher.last_id em três etapas ligadas por
+    filas limitadas: leitura (iter_messages em ordem crescente de id), parse
+    (message_to_row, agrupando blocos de chunk_rows linhas) e escrita (um
+    batcher.flush por bloco, que só então avança last_id no state.json).
+    No máximo ~4 blocos ficam em memória, seja qual for o tamanho do
+    histórico; se o processo cair, a próxima execução continua do último
+    bloco gravado. Devolve quantas linhas foram gravadas.
+    """
+    mensagens = asyncio.Queue(maxsize=chunk_rows)
+    blocos = asyncio.Queue(maxsize=2)
+    gravadas = 0
+
+    async def ler():
+        async for msg in client.iter_messages(entity, min_id=batcher.last_id, reverse=True):
+            if msg.message:
+                await mensagens.put(msg)
+        await mensagens.put(None)
+
+    async def interpretar():
+        bloco, n_linhas = [], 0
+        while (msg := await mensagens.get()) is not None:
+            linha = message_to_row(msg)
+            bloco.append((msg.id, linha))
+            if linha is not None:
+                n_linhas += 1
+            if n_linhas >= chunk_rows:
+                await blocos.put(bloco)
+                bloco, n_linhas = [], 0
+        if bloco:
+            await blocos.put(bloco)
+        await blocos.put(None)
+
+    async def gravar():
+        nonlocal gravadas
+        while (bloco := await blocos.get()) is not None:
+            for msg_id, linha in bloco:
+                batcher.add(msg_id, linha)
+            n = await batcher.flush()
+            gravadas += n
+            print("Bloco gravado:", n, "linhas | last_id:", batcher.last_id)
+
+    etapas = [asyncio.ensure_future(etapa()) for etapa in (ler, interpretar, gravar)]
+    try:
+        await asyncio.gather(*etapas)
+    except BaseException:
+        # uma etapa falhou: as outras param (nada além do último bloco gravado é salvo)
+        for etapa in etapas:
+            etapa.cancel()
+        await asyncio.gather(*etapas, return_exceptions=True)
+        raise
+    return gravadas
+
+
+async def run_daemon(client, entity, ws, state_file, state_data, seen, flush_seconds, flush_rows, chunk_rows):
+    """
+    Modo contínuo: recebe as mensagens do canal por events.NewMessage e grava
+    em lotes pelo MicroBatcher, com o state.json salvo a cada flush. Antes,
+    alcança o que chegou desde o último last_id com backfill() (blocos de
+    chunk_rows linhas). SIGINT/SIGTERM encerram
+    depois de gravar o que estiver no buffer.
+    """
+    col_idx_map = ensure_headers(ws, REQUIRED_HEADERS, HIDDEN_HEADERS)
+    batcher = MicroBatcher(ws, col_idx_map, state_file, state_data, flush_seconds, flush_rows, seen)
+
+    # Mensagens ao vivo que chegam durante o alcance ficam guardadas: gravá-las
+    # antes das antigas avançaria last_id por cima das que ainda faltam
+    adiadas = []
+    alcancando = True
+
+    async def on_new_message(event):
+        msg = event.message
+        if not msg.message:
+            return
+        if alcancando:
+            adiadas.append(msg)
+        else:
+            batcher.add(msg.id, message_to_row(msg))
+
+    client.add_event_handler(on_new_message, events.NewMessage(chats=entity))
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: Ctrl+C interrompe sem o flush final
+            pass
+
+    try:
+        print("Alcançando mensagens desde last_id:", batcher.last_id)
+        await backfill(client, entity, batcher, chunk_rows)
+        alcancando = False
+        for msg in sorted(adiadas, key=lambda m: m.id):
+            batcher.add(msg.id, message_to_row(msg))
+        adiadas.clear()
+        await batcher.flush()
+
+        print("Ouvindo o canal (Ctrl+C para encerrar)...")
+        runner = asyncio.ensure_future(batcher.run(stop))
+        await asyncio.wait([runner, client.disconnected], return_when=asyncio.FIRST_COMPLETED)
+        if not runner.done():
+            print("Conexão com o Telegram encerrada.")
+            stop.set()
+        await runner
+    finally:
+        client.remove_event_handler(on_new_message)
+
+
+async def main(
+    daemon=False,
+    flush_seconds=DAEMON_FLUSH_SECONDS,
+    flush_rows=DAEMON_FLUSH_ROWS,
+    chunk_rows=WRITE_CHUNK_ROWS,
+):
     base_dir = _find_base_dir()
     state_file = base_dir / "data" / "state.json"
+    seen = SeenIds(base_dir / "data" / "telegram_seen.sqlite")
 
     api_id = int(_get_required("API_ID"))
     api_hash = _get_required("API_HASH")
@@ -260,7 +415,7 @@ async def main():
     print("Iniciando...")
     print("STATE_FILE:", str(state_file))
 
-    ws = connect_worksheet(sheet_id, worksheet_name, service_account_json)
+    ws = open_worksheet(sheet_id, worksheet_name, service_account_json)
     print("Conectado na planilha:", sheet_id)
     print("Aba:", worksheet_name)
 
@@ -283,59 +438,55 @@ async def main():
         entity = await client.get_entity(ch)
         print("Canal carregado com sucesso.")
 
-        msgs = []
-        async for msg in client.iter_messages(entity, min_id=last_id):
-            if msg.message:
-                msgs.append(msg)
-        msgs.sort(key=lambda m: m.id)
-        print("Mensagens novas encontradas:", len(msgs))
-
-        max_seen_id = last_id
-
-        # 1) Cabeçalhos uma vez só
-        required_headers = ["Tipo", "Valor", "Descrição", "Cliente", "Forma de Pagamento", "Data"]
-        col_idx_map = ensure_headers(ws, required_headers)  # pode fazer 1 leitura + 1 escrita se cabeçalho faltar
-
-        # 2) Primeira linha vazia uma única vez
-        key_col = col_idx_map.get("Data", 1)  # usamos "Data" como coluna de referência
-        start_row = first_empty_row(ws, key_col)
-
-        # 3) Montar o lote de linhas
-        rows_to_write = []
-        for msg in msgs:
-            texto_bruto = (msg.message or "").strip()
-            payload = parse_telegram_payload(texto_bruto)
-            if payload is None:
-                max_seen_id = max(max_seen_id, msg.id)
-                continue
+        if daemon:
+            await run_daemon(client, entity, ws, state_file, state_data, seen, flush_seconds, flush_rows, chunk_rows)
+            print(quota.summary())
+            return
+
+        # Cabeçalhos uma vez só (1 leitura + 1 escrita se faltar algum)
+        col_idx_map = ensure_headers(ws, REQUIRED_HEADERS, HIDDEN_HEADERS)
+
+        # Histórico em blocos: cada bloco relê a primeira linha vazia, grava
+        # numa chamada batch_write_rows e salva o last_id no state.json
+        batcher = MicroBatcher(ws, col_idx_map, state_file, state_data, seen=seen)
+        gravadas = await backfill(client, entity, batcher, chunk_rows)
 
-            # Data: usa data do payload (normalizada) ou a data do envio (apenas YYYY-MM-DD)
-            data_envio = msg.date.astimezone().strftime("%Y-%m-%d %H:%M:%S") if msg.date else ""
-            data_norm = normalize_date_str(payload.get("Data"))
-            if str(data_norm).strip() == "":
-                data_norm = str(data_envio).split(" ")[0] if data_envio else ""
-
-            linha = [
-                payload.get("Tipo") or "",
-                payload.get("Valor") or "",
-                payload.get("Descrição") or "",
-                payload.get("Cliente") or "",
-                payload.get("Forma de Pagamento") or "",
-                data_norm or "",
-            ]
-            rows_to_write.append(linha)
-            max_seen_id = max(max_seen_id, msg.id)
-
-        # 4) Escrita única em lote (reduz drasticamente "write requests/min")
-        if rows_to_write:
-            batch_write_rows(ws, col_idx_map, rows_to_write, start_row)
-
-        # 5) Atualiza estado uma única vez
-        state_data["last_id"] = max_seen_id
-        save_state(state_file, state_data)
-        print("Finalizado. last_id atualizado:", max_seen_id)
+        print("Linhas gravadas:", gravadas)
+        print("Finalizado. last_id atualizado:", batcher.last_id)
+        print(quota.summary())
 
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Copia os lançamentos do canal do Telegram para a planilha.")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="fica ouvindo o canal e grava as mensagens novas em lotes, em vez de rodar uma vez e sair",
+    )
+    parser.add_argument(
+        "--flush-seconds",
+        type=float,
+        default=DAEMON_FLUSH_SECONDS,
+        help="no modo --daemon, intervalo máximo entre gravações na planilha",
+    )
+    parser.add_argument(
+        "--flush-rows",
+        type=int,
+        default=DAEMON_FLUSH_ROWS,
+        help="no modo --daemon, grava assim que juntar essa quantidade de linhas",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=WRITE_CHUNK_ROWS,
+        help="linhas por gravação ao copiar o histórico; last_id avança a cada bloco",
+    )
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            daemon=args.daemon,
+            flush_seconds=args.flush_seconds,
+            flush_rows=args.flush_rows,
+            chunk_rows=args.chunk_rows,
+        )
+    )
@@ -0,0 +1,71 @@
+from pathlib import Path
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from services import write_queue  # noqa: E402
+from services.write_queue import TAG_COL, WriteQueue  # noqa: E402
+
+
+class FakeWorksheet:
+    def __init__(self, header):
+        self.rows = [list(header)]
+        self.col_count = len(header)
+        self.appends = 0
+
+    def row_values(self, i):
+        return list(self.rows[i - 1])
+
+    def col_values(self, col):
+        return [(row + [""] * col)[col - 1] for row in self.rows]
+
+    def add_cols(self, n):
+        self.col_count += n
+
+    def update_cell(self, row, col, value):
+        self.rows[row - 1] = (self.rows[row - 1] + [""] * col)[:col]
+        self.rows[row - 1][col - 1] = value
+
+    def hide_columns(self, start, end):
+        pass
+
+    def append_rows(self, rows, value_input_option=None):
+        self.appends += 1
+        self.rows.extend(list(r) for r in rows)
+
+
+def _crash_mid_send(queue, ws):
+    # processo que reservou o lote, gravou na planilha e morreu antes de _finish
+    claimed = queue._claim(write_queue.MAX_BATCH_ROWS)
+    tag_col = queue._tag_column(ws)
+    ws.append_rows([(list(row) + [""] * tag_col)[:tag_col - 1] + [tag] for _, row, tag, _ in claimed[:2]])
+    expirado = time.time() - write_queue.STALE_SENDING_SECONDS - 1
+    with queue._connect() as conn:
+        conn.execute("UPDATE queue SET claimed = ?", (expirado,))
+
+
+def test_stale_sending_rows_are_released_without_new_submissions(tmp_path):
+    queue = WriteQueue(tmp_path / "queue.sqlite")
+    ws = FakeWorksheet(["Data", "Valor"])
+    for i in range(3):
+        queue.enqueue(["2025-01-01", str(i)])
+    _crash_mid_send(queue, ws)
+    assert queue.status()["counts"] == {"sending": 3}
+
+    assert queue._due()
+    assert queue.status()["counts"] == {"pending": 3}
+
+
+def test_recovered_rows_already_in_the_sheet_are_not_sent_again(tmp_path):
+    queue = WriteQueue(tmp_path / "queue.sqlite")
+    ws = FakeWorksheet(["Data", "Valor"])
+    for i in range(3):
+        queue.enqueue(["2025-01-01", str(i)])
+    _crash_mid_send(queue, ws)
+
+    assert queue.flush(lambda: ws) == 3
+    assert queue.status()["counts"] == {"flushed": 3}
+    assert ws.rows[0][-1] == TAG_COL
+    assert [row[1] for row in ws.rows[1:]] == ["0", "1", "2"]
+    assert ws.appends == 2